@@ -1,118 +1,520 @@
 """
 智能视觉分析助手 - Flask主应用
 """
-from flask import Flask, render_template, request, jsonify
-from flask_socketio import SocketIO, emit
+# 导入eventlet但不monkey_patch（避免递归错误）
+import eventlet
+from eventlet import tpool
+from config import Config
+
+# 多worker部署使用Redis消息队列时，python-socketio要求协作式socket；
+# 只patch socket/select，采集、检测、tpool等原生线程保持不变
+if Config.SOCKETIO_MESSAGE_QUEUE.startswith(('redis://', 'rediss://')):
+    eventlet.monkey_patch(socket=True, select=True)
+
+from flask import Flask, render_template, request, jsonify, Response
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import cv2
 import base64
 import time
 import json
+import numpy as np
 from datetime import datetime
 
-# 导入eventlet但不monkey_patch（避免递归错误）
-import eventlet
-
 # 导入自定义模块
-from config import Config
 from models.yolo_detector import YOLODetector
-from models.qwen_client import QwenVLClient
+from models.yolo_process_pool import ProcessPoolYOLODetector
+from models.qwen_client import QwenVLClient, SCENE_ANALYSIS_QUESTION
+from models.detection_worker import DetectionWorker
+from models.micro_batcher import MicroBatcher
+from models.vlm_pool import VLMWorkerPool
 from utils.video_processor import VideoProcessor
-from utils.image_utils import resize_image, add_timestamp, image_to_base64
+from utils.frame_bus import BusVideoSource, BusDetectionClient
+from utils.frame_pool import FramePool
+from utils.stream_broadcaster import StreamBroadcaster, LatestFrameChannel
+from utils.offload import Offloader, hub_lag_monitor
+from utils.latency import LatencyRecorder
+from utils.response_cache import same_request
+from utils.message_queue import socketio_queue_options, create_control_channel
+from utils.image_utils import resize_image, add_timestamp, image_to_base64, encode_jpeg
 
 # 初始化Flask应用
 app = Flask(__name__)
 app.config.from_object(Config)
 # 移除async_mode参数，让Flask-SocketIO自动选择最佳模式
-socketio = SocketIO(app, cors_allowed_origins="*")
+# 配置SOCKETIO_MESSAGE_QUEUE后，跨worker的emit经消息队列转发到持有该连接的worker
+socketio = SocketIO(app, cors_allowed_origins="*", **socketio_queue_options())
+# worker之间的控制通道：非推流worker向推流worker上报本worker的观众状态，
+# 推流worker把编码好的视频帧按（叠加模式, 档位）逐个发布给其他worker
+control_channel = create_control_channel()
+VIEWER_EVENTS = f"{Config.SOCKETIO_CHANNEL}:viewers"
+STREAM_EVENTS = f"{Config.SOCKETIO_CHANNEL}:stream"
+# 推流worker记录其他worker上报的观众状态：
+# worker_id -> {"variants": {(overlay, 档位)}, "viewers": WebSocket观众数, "mjpeg": MJPEG连接数}
+remote_viewers = {}
+# 非推流worker最近一次上报的观众状态（变化时才重新上报）
+reported_viewer_state = None
 
 # 全局变量
 video_processor = None
 yolo_detector = None
+detection_worker = None
+detection_batcher = None
 qwen_client = None
 is_processing = False
-current_frame = None
+current_frame_seq = 0
+current_frame_handle = None
 detection_results = None
+# 标注输出缓冲池：每帧只做一次拷贝，检测框和时间戳都原地绘制在池化缓冲区中
+output_pool = FramePool(size=2, name="output")
+stream_stats = {"frames": 0, "skipped": 0, "idle_frames": 0}
+# 标注/编码/写文件等阻塞操作卸载到原生线程池，保持hub响应；同时统计各接口延迟
+offloader = Offloader()
+latency = LatencyRecorder()
+# VLM调用（3-10秒）在有界任务池中执行，结果完成后发回发起请求的客户端
+# 画面基本不变时的相同请求（问题、检测摘要相同）合并为一次调用
+vlm_pool = VLMWorkerPool(lambda event, data, sid: socketio.emit(event, data, to=sid), recorder=latency,
+                         key_match=same_request)
+
+def send_video_frame(sid, payload, callback):
+    """
+    向单个客户端发送视频帧，客户端消费后通过ack回调确认
+    
+    观众总是登记在自己连接的worker上，直接发送而不经过消息队列
+    """
+    socketio.emit('video_frame', payload, to=sid, namespace='/', callback=callback, ignore_queue=True)
+
+def send_latency_probe(sid, callback):
+    """向单个客户端发送往返时间探测（客户端收到后立即确认）"""
+    socketio.emit('latency_probe', {}, to=sid, namespace='/', callback=callback, ignore_queue=True)
+
+# 视频帧广播器：每帧编码一次，按客户端确认节奏分发，慢客户端丢弃过期帧；
+# 每个worker只管理连接到本worker的观众（确认、背压与自适应档位都在本地完成）
+broadcaster = StreamBroadcaster(send_video_frame, probe_func=send_latency_probe)
+VIEWER_ROOM = 'viewers'
+# 浏览器叠加模式的观众：接收原始画面，检测框按检测频率单独推送
+OVERLAY_ROOM = 'overlay_viewers'
+last_overlay_seq = None
+# MJPEG通道：标注流与原始流各自只编码一次，由所有HTTP连接共享
+annotated_channel = LatestFrameChannel('annotated')
+raw_channel = LatestFrameChannel('raw')
+
+def viewer_count():
+    """本worker观看标注视频流的观众数量（WebSocket + MJPEG）"""
+    return broadcaster.client_count() + annotated_channel.subscriber_count()
+
+def local_mjpeg_count():
+    """本worker的MJPEG连接数"""
+    return annotated_channel.subscriber_count() + raw_channel.subscriber_count()
+
+def has_stream_consumers():
+    """
+    当前帧是否需要编码：推流worker看本worker的观众和其他worker上报的组合，
+    非推流worker只需为本worker的MJPEG连接编码
+    """
+    if Config.STREAM_PRODUCER:
+        return viewer_count() + raw_channel.subscriber_count() > 0 or bool(remote_variants())
+    return local_mjpeg_count() > 0
+
+def remote_variants():
+    """推流worker：其他worker的观众正在使用的（叠加模式, 档位）组合"""
+    variants = set()
+    for worker in remote_viewers.values():
+        variants |= worker["variants"]
+    return variants
+
+def update_idle_state():
+    """根据观众数量切换空闲模式：无人观看时暂停标注/编码，检测降为心跳"""
+    if not Config.STREAM_PRODUCER:
+        # 空闲状态由推流worker统一决定，这里只上报本worker的观众状态
+        report_viewer_state()
+        return
+    if detection_worker:
+        remote = sum(worker["viewers"] + worker["mjpeg"] for worker in remote_viewers.values())
+        detection_worker.set_idle(viewer_count() + raw_channel.subscriber_count() + remote == 0)
+
+def report_viewer_state(force=False):
+    """
+    非推流worker：向推流worker上报本worker的观众状态（正在使用的组合、观众数、MJPEG连接数）
+    
+    Args:
+        force: 状态未变化时也重新上报（推流worker重启后请求重新同步）
+    """
+    global reported_viewer_state
+    state = {
+        "variants": sorted(broadcaster.active_variants()),
+        "viewers": broadcaster.client_count(),
+        "mjpeg": local_mjpeg_count()
+    }
+    if not force and state == reported_viewer_state:
+        return
+    reported_viewer_state = state
+    control_channel.publish(VIEWER_EVENTS, dict(state, event='state', worker=Config.WORKER_ID))
+
+def register_viewer(sid, overlay):
+    """登记WebSocket观众（观众始终由所连接的worker的广播器管理）"""
+    broadcaster.add_client(sid, overlay)
+    update_idle_state()
+
+def unregister_viewer(sid):
+    """注销WebSocket观众"""
+    broadcaster.remove_client(sid)
+    update_idle_state()
+
+def handle_viewer_event(message):
+    """推流worker：处理其他worker上报的观众状态（后到的状态整体替换之前的状态）"""
+    if message["worker"] == Config.WORKER_ID or message["event"] != 'state':
+        return
+    remote_viewers[message["worker"]] = {
+        "variants": {tuple(variant) for variant in message["variants"]},
+        "viewers": message["viewers"],
+        "mjpeg": message["mjpeg"]
+    }
+    update_idle_state()
+
+def handle_stream_event(message):
+    """非推流worker：处理推流worker发布的视频帧与重新同步请求"""
+    event = message["event"]
+    if event == 'frame':
+        with app.app_context():
+            broadcaster.publish({tuple(message["variant"]): message["payload"]})
+        # 客户端档位随确认延迟自适应调整，组合变化后立即上报，推流worker从下一帧起编码新组合
+        report_viewer_state()
+    elif event == 'resync':
+        # 推流worker（重新）启动，之前上报的状态已丢失
+        report_viewer_state(force=True)
+
+def acquire_current_frame():
+    """
+    获取当前帧的引用，保证卸载到线程池处理期间缓冲区不被复用
+    
+    Returns:
+        FrameHandle: 调用方用完后需release()，没有帧时返回None
+    """
+    if current_frame_handle is None:
+        return None
+    return current_frame_handle.retain()
+
+def get_current_frame():
+    """
+    获取当前帧像素（直通模式下首次访问时解码）
+    
+    Returns:
+        numpy.ndarray: 共享只读帧，没有帧时返回None
+    """
+    if current_frame_handle is None:
+        return None
+    return current_frame_handle.frame
+
+def set_current_frame(packet):
+    """更新当前帧（直接持有共享只读句柄，替换时释放旧句柄）"""
+    global current_frame_seq, current_frame_handle
+    previous_handle = current_frame_handle
+    current_frame_handle = packet["handle"]
+    current_frame_seq = packet["seq"]
+    if previous_handle is not None:
+        previous_handle.release()
 
-def initialize_components():
-    """初始化系统组件"""
-    global video_processor, yolo_detector, qwen_client
+def encode_renditions(image, renditions):
+    """
+    按码率阶梯编码指定档位（低档位从上一档缩放而来，减少缩放开销）
+    
+    Args:
+        image: 待编码图像
+        renditions: 需要编码的档位索引集合
+        
+    Returns:
+        dict: 档位索引 -> JPEG字节
+    """
+    jpegs = {}
+    if not renditions:
+        return jpegs
+    
+    scaled = image
+    for index, rendition in enumerate(Config.STREAM_RENDITIONS[:max(renditions) + 1]):
+        scaled = resize_image(
+            scaled,
+            max_width=min(rendition["width"], Config.MAX_FRAME_WIDTH),
+            max_height=Config.MAX_FRAME_HEIGHT
+        )
+        if index in renditions:
+            jpeg = encode_jpeg(scaled, quality=min(rendition["quality"], Config.STREAM_QUALITY))
+            if jpeg:
+                jpegs[index] = jpeg
+    return jpegs
+
+def render_annotated_jpegs(handle, overlay_objects, renditions):
+    """
+    生成带检测框和时间戳的各档位JPEG（每帧只拷贝一次到池化输出缓冲区）
+    
+    Args:
+        handle: 共享帧句柄（直通模式下在此解码）
+        overlay_objects: 要叠加的对象列表
+        renditions: 需要编码的档位索引集合
+        
+    Returns:
+        dict: 档位索引 -> JPEG字节
+    """
+    frame = handle.frame
+    output = output_pool.acquire(frame.shape, frame.dtype)
+    try:
+        np.copyto(output.buffer, frame)
+        output_pool.record_copy(frame.nbytes)
+        
+        # 将检测框原地绘制到池化输出缓冲区
+        if Config.STREAM_ANNOTATIONS and yolo_detector and overlay_objects:
+            yolo_detector.draw_objects(output.buffer, overlay_objects)
+        
+        # 原地添加时间戳
+        timestamped_frame = add_timestamp(output.buffer, inplace=True)
+        
+        # 按需缩放并编码各档位
+        return encode_renditions(timestamped_frame, renditions)
+    finally:
+        output.release()
+
+def render_raw_jpegs(handle, renditions):
+    """
+    生成不带任何叠加的原始画面各档位JPEG
+    
+    直通模式下最高档位直接转发摄像头的JPEG字节，不解码也不重新编码；
+    只有需要更低档位时才解码。
+    
+    Returns:
+        dict: 档位索引 -> JPEG字节
+    """
+    jpegs = {}
+    if handle.jpeg is not None and 0 in renditions:
+        jpegs[0] = handle.jpeg
+        renditions = renditions - {0}
+    if renditions:
+        jpegs.update(encode_renditions(handle.frame, renditions))
+    return jpegs
+
+def initialize_components(frame_bus=None):
+    """
+    初始化系统组件
+    
+    Args:
+        frame_bus: 可选的FrameBus实例。提供时本进程只作为Web服务：
+                   帧来自采集进程，检测结果来自检测进程（见run_pipeline.py）
+    """
+    global video_processor, yolo_detector, detection_worker, detection_batcher, qwen_client, video_greenthread
     
     print("正在初始化系统组件...")
     
-    # 初始化视频处理器
-    video_processor = VideoProcessor()
+    if frame_bus is not None:
+        # 多进程管线：从共享内存帧总线读取帧和检测结果，本进程不加载模型
+        video_processor = BusVideoSource(frame_bus, sleep=eventlet.sleep)
+        yolo_detector = YOLODetector(load=False)
+        detection_worker = BusDetectionClient(frame_bus)
+    else:
+        # 初始化视频处理器
+        video_processor = VideoProcessor()
+        
+        # 初始化YOLO检测器（配置了YOLO_WORKERS时使用多进程检测）
+        if Config.YOLO_WORKERS > 0:
+            yolo_detector = ProcessPoolYOLODetector(Config.YOLO_WORKERS)
+        else:
+            yolo_detector = YOLODetector()
+        
+        # 启动检测线程（以DETECTION_FPS独立运行，流循环只叠加最新检测结果）
+        detection_worker = DetectionWorker(yolo_detector, video_processor)
+        detection_worker.start()
     
-    # 初始化YOLO检测器
-    yolo_detector = YOLODetector()
+    if Config.STREAM_PRODUCER:
+        if control_channel is not None:
+            control_channel.subscribe(VIEWER_EVENTS, handle_viewer_event)
+            # 推流worker（重新）启动：请求其他worker重新上报观众状态
+            control_channel.publish(STREAM_EVENTS, {'event': 'resync', 'worker': Config.WORKER_ID})
+    elif control_channel is None:
+        raise RuntimeError("非推流worker需要配置SOCKETIO_MESSAGE_QUEUE")
+    else:
+        control_channel.subscribe(STREAM_EVENTS, handle_stream_event)
+        # worker（重新）启动：上报当前（空）状态，替换推流worker记录的旧状态
+        report_viewer_state(force=True)
+    update_idle_state()
+    
+    # 微批处理器：合并REST接口等并发检测请求为一次批量推理
+    detection_batcher = MicroBatcher(yolo_detector)
     
     # 初始化Qwen客户端
     qwen_client = QwenVLClient()
     
+    # hub调度延迟探针（衡量hub被阻塞的程度）
+    eventlet.spawn(hub_lag_monitor, latency)
+    
+    if frame_bus is not None:
+        # 摄像头由采集进程管理（可能由其他worker启动），流循环常驻，摄像头未启动时等待
+        video_greenthread = eventlet.spawn(video_stream_greenthread)
+    
     print("系统组件初始化完成!")
 
+def build_detection_update(result, frame_shape):
+    """
+    构造浏览器叠加用的检测结果消息
+    
+    Args:
+        result: 检测线程发布的结果
+        frame_shape: 检测所用帧的形状，浏览器据此把检测框缩放到显示尺寸
+        
+    Returns:
+        dict: detection_update事件数据
+    """
+    return {
+        'seq': result.get('seq'),
+        'frame_size': [int(frame_shape[1]), int(frame_shape[0])],
+        'object_count': result.get('object_count', 0),
+        'objects': result.get('objects', [])
+    }
+
+def publish_detection_update(frame_shape):
+    """检测结果更新时推送给浏览器叠加模式的观众（按检测频率，与视频帧率无关）"""
+    global last_overlay_seq
+    if detection_worker is None:
+        return
+    if broadcaster.overlay_client_count() == 0 \
+            and not any(overlay == 'client' for overlay, _ in remote_variants()):
+        return
+    if detection_results.get('seq') == last_overlay_seq:
+        return
+    last_overlay_seq = detection_results.get('seq')
+    with app.app_context():
+        socketio.emit('detection_update', build_detection_update(detection_results, frame_shape),
+                      to=OVERLAY_ROOM, namespace='/')
+
+def refresh_detection_results():
+    """读取检测线程发布的最新结果，供检测摘要、问答与场景分析使用"""
+    global detection_results
+    if detection_worker:
+        detection_results = detection_worker.get_latest_result()
+    else:
+        detection_results = {"objects": [], "object_count": 0}
+
+def publish_frame(packet, frame_count):
+    """编码一帧并分发给WebSocket观众和MJPEG连接（每种画面只编码一次）"""
+    handle = packet["handle"]
+    seq = packet["seq"]
+    
+    # 检测结果已由流循环刷新；叠加的框按当前帧时间由跟踪器外推
+    if detection_worker:
+        overlay_objects = detection_worker.get_tracked_objects(packet["timestamp"])
+    else:
+        overlay_objects = []
+    
+    # 只编码有人订阅的（叠加模式, 档位）组合；MJPEG连接使用最高档位。
+    # 非推流worker只为本worker的MJPEG连接编码，WebSocket观众的帧来自推流worker
+    remote = remote_variants()
+    variants = broadcaster.active_variants() | remote if Config.STREAM_PRODUCER else set()
+    annotated_renditions = {index for overlay, index in variants if overlay == 'server'}
+    raw_renditions = {index for overlay, index in variants if overlay == 'client'}
+    if annotated_channel.subscriber_count() > 0:
+        annotated_renditions.add(0)
+    if raw_channel.subscriber_count() > 0:
+        raw_renditions.add(0)
+    if not annotated_renditions and not raw_renditions:
+        return
+    
+    # 原始画面不做任何绘制，由浏览器叠加模式的观众和原始MJPEG流共享
+    if handle.jpeg is not None and raw_renditions == {0}:
+        # 直通模式且只需最高档位：无需解码和编码，不必进入线程池
+        raw_jpegs = render_raw_jpegs(handle, raw_renditions)
+    else:
+        raw_jpegs = offloader.run(render_raw_jpegs, handle, raw_renditions) if raw_renditions else {}
+    jpegs = offloader.run(render_annotated_jpegs, handle, overlay_objects, annotated_renditions) \
+        if annotated_renditions else {}
+    if not jpegs and not raw_jpegs:
+        if frame_count % 30 == 0:
+            print(f"❌ 帧转换失败")
+        return
+    
+    if 0 in jpegs:
+        annotated_channel.publish(seq, jpegs[0])
+    if 0 in raw_jpegs:
+        raw_channel.publish(seq, raw_jpegs[0])
+    if not Config.STREAM_PRODUCER or (broadcaster.client_count() == 0 and not remote):
+        return
+    
+    publish_detection_update(handle.shape)
+    
+    try:
+        # 同一组合的编码结果分发给该组合的所有客户端
+        detection_info = {
+            'object_count': len(overlay_objects),
+            'objects': overlay_objects
+        }
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        payloads = {}
+        for overlay, encoded in (('server', jpegs), ('client', raw_jpegs)):
+            for index, jpeg in encoded.items():
+                payload = {
+                    'frame': jpeg,
+                    'seq': seq,
+                    'rendition': Config.STREAM_RENDITIONS[index]['name'],
+                    'overlay': overlay,
+                    'timestamp': timestamp
+                }
+                # 浏览器叠加模式的检测框通过detection_update单独推送
+                if overlay == 'server':
+                    payload['detection_info'] = detection_info
+                payloads[(overlay, index)] = payload
+        with app.app_context():
+            broadcaster.publish(payloads)
+        # 其他worker的观众：每个组合只发布一次，由各worker的广播器分发给本地观众
+        for variant in remote:
+            if variant in payloads:
+                control_channel.publish(STREAM_EVENTS, {
+                    'event': 'frame', 'worker': Config.WORKER_ID,
+                    'variant': list(variant), 'payload': payloads[variant]
+                })
+        
+        # 每30帧打印一次状态
+        if frame_count % 30 == 0:
+            sizes = ", ".join(
+                f"{overlay}:{Config.STREAM_RENDITIONS[index]['name']}={len(payload['frame'])}"
+                for (overlay, index), payload in sorted(payloads.items())
+            )
+            print(f"📹 已发送 {frame_count} 帧, 帧大小: {sizes} 字节")
+    except Exception as e:
+        print(f"❌ WebSocket发送失败: {e}")
+
 def video_stream_greenthread():
     """视频流处理greenthread - 使用eventlet"""
-    global is_processing, current_frame, detection_results
+    global is_processing
     
     print("🎥 视频流greenthread已启动（eventlet模式）")
     frame_count = 0
+    skipped_count = 0
+    last_seq = 0
     last_log_time = time.time()
     
     while True:
         try:
             # 每5秒打印一次状态
             if time.time() - last_log_time > 5:
-                print(f"📊 状态: 摄像头可用={video_processor.is_camera_available() if video_processor else False}, 帧数={frame_count}")
+                print(f"📊 状态: 摄像头可用={video_processor.is_camera_available() if video_processor else False}, 帧数={frame_count}, 跳过重复={skipped_count}")
                 last_log_time = time.time()
             
             if video_processor and video_processor.is_camera_available():
-                frame = video_processor.get_latest_frame()
+                # 只取比上次处理更新的帧（非阻塞，避免卡住eventlet hub）
+                packet = video_processor.wait_for_frame(last_seq, timeout=0)
                 
-                if frame is not None:
-                    current_frame = frame.copy()
-                    frame_count += 1
-                    
-                    # 执行目标检测
-                    if yolo_detector and yolo_detector.is_model_ready():
-                        detection_results = yolo_detector.detect_objects(frame)
-                        annotated_frame = detection_results.get('annotated_frame', frame)
-                    else:
-                        annotated_frame = frame
-                        detection_results = {"objects": [], "object_count": 0}
-                    
-                    # 添加时间戳
-                    timestamped_frame = add_timestamp(annotated_frame)
-                    
-                    # 调整图像大小（使用配置的最大尺寸）
-                    display_frame = resize_image(
-                        timestamped_frame, 
-                        max_width=Config.MAX_FRAME_WIDTH, 
-                        max_height=Config.MAX_FRAME_HEIGHT
-                    )
+                if packet is None:
+                    skipped_count += 1
+                    stream_stats["skipped"] += 1
+                else:
+                    last_seq = packet["seq"]
+                    set_current_frame(packet)
+                    # 无论本worker是否需要编码都刷新检测结果：非推流worker的WebSocket观众、
+                    # 空闲时的心跳检测都依赖它（检测摘要、问答与场景分析）
+                    refresh_detection_results()
                     
-                    # 转换为base64并发送（使用配置的质量）
-                    frame_base64 = image_to_base64(display_frame, quality=Config.STREAM_QUALITY)
-                    if frame_base64:
-                        try:
-                            # 使用eventlet的方式发送
-                            with app.app_context():
-                                socketio.emit('video_frame', {
-                                    'frame': frame_base64,
-                                    'detection_info': {
-                                        'object_count': detection_results.get('object_count', 0),
-                                        'objects': detection_results.get('objects', [])
-                                    },
-                                    'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                                }, namespace='/')
-                            
-                            # 每30帧打印一次状态
-                            if frame_count % 30 == 0:
-                                print(f"📹 已发送 {frame_count} 帧, 帧大小: {len(frame_base64)} 字节")
-                        except Exception as e:
-                            print(f"❌ WebSocket发送失败: {e}")
+                    if not has_stream_consumers():
+                        # 无人观看：只更新当前帧和检测结果（供问答/截图/检测摘要使用），跳过拷贝、标注和编码
+                        stream_stats["idle_frames"] += 1
                     else:
-                        if frame_count % 30 == 0:
-                            print(f"❌ 帧转换失败")
+                        frame_count += 1
+                        stream_stats["frames"] += 1
+                        publish_frame(packet, frame_count)
             else:
                 # 摄像头未启动时等待
                 eventlet.sleep(0.5)
@@ -125,10 +527,69 @@ def video_stream_greenthread():
             traceback.print_exc()
             eventlet.sleep(1)
 
+@app.before_request
+def start_request_timer():
+    """记录请求开始时间"""
+    request.start_time = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    """记录HTTP接口耗时（流式响应只统计到响应头返回）"""
+    start = getattr(request, 'start_time', None)
+    if start is not None and request.endpoint:
+        latency.record(f"http:{request.endpoint}", (time.perf_counter() - start) * 1000)
+    return response
+
 @app.route('/')
 def index():
-    """主页"""
-    return render_template('index.html')
+    """主页（叠加模式开关的初始状态取自STREAM_OVERLAY_MODE）"""
+    return render_template('index.html', overlay_mode=Config.STREAM_OVERLAY_MODE)
+
+def mjpeg_response(channel):
+    """
+    生成multipart/x-mixed-replace JPEG流响应
+    
+    每个连接只取通道中的最新帧，消费慢的连接自然跳过中间帧；
+    可通过 ?fps= 限制该连接的最大帧率。
+    """
+    max_fps = request.args.get('fps', type=float) or Config.STREAM_FPS
+    interval = 1.0 / max(min(max_fps, Config.STREAM_FPS), 0.1)
+    
+    def generate():
+        channel.subscribe()
+        update_idle_state()
+        last_seq = 0
+        try:
+            while True:
+                # 挂起直到有新帧发布（超时后重新检查，连接断开时可以及时退出）
+                seq, jpeg = channel.wait_for_frame(last_seq, timeout=1.0)
+                if jpeg is None or seq == last_seq:
+                    continue
+                last_seq = seq
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n'
+                       b'Content-Length: ' + str(len(jpeg)).encode() + b'\r\n\r\n' +
+                       jpeg + b'\r\n')
+                eventlet.sleep(interval)
+        finally:
+            channel.unsubscribe()
+            update_idle_state()
+    
+    return Response(
+        generate(),
+        mimetype='multipart/x-mixed-replace; boundary=frame',
+        headers={'Cache-Control': 'no-cache, private', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/video_feed')
+def video_feed():
+    """MJPEG视频流（带检测框和时间戳），可直接用于<img>、VLC或NVR"""
+    return mjpeg_response(annotated_channel)
+
+@app.route('/video_feed/raw')
+def video_feed_raw():
+    """MJPEG原始视频流（无任何叠加）"""
+    return mjpeg_response(raw_channel)
 
 @app.route('/api/camera/start', methods=['POST'])
 def start_camera():
@@ -186,89 +647,254 @@ def detection_summary():
     except Exception as e:
         return jsonify({"success": False, "message": f"获取检测摘要失败: {str(e)}"})
 
+@app.route('/api/detection/detect', methods=['POST'])
+def detect_image():
+    """对上传的图像执行目标检测（并发请求会被合并为批量推理）"""
+    try:
+        file = request.files.get('image')
+        if file is None:
+            return jsonify({"success": False, "message": "缺少image文件"})
+        
+        data = np.frombuffer(file.read(), dtype=np.uint8)
+        image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        if image is None:
+            return jsonify({"success": False, "message": "无法解码图像"})
+        if not yolo_detector.is_model_ready():
+            return jsonify({"success": False, "message": "YOLO模型未加载"})
+        
+        # 在原生线程中等待批量推理结果，不阻塞eventlet hub
+        result = tpool.execute(detection_batcher.detect, image, 30)
+        return jsonify({
+            "success": True,
+            "summary": yolo_detector.get_detection_summary(result['objects']),
+            "object_count": result['object_count'],
+            "objects": result['objects']
+        })
+    except Exception as e:
+        return jsonify({"success": False, "message": f"检测失败: {str(e)}"})
+
+@app.route('/api/stats', methods=['GET'])
+def pipeline_stats():
+    """获取视频管线统计信息（帧缓冲池分配与拷贝量等）"""
+    try:
+        frames = max(stream_stats["frames"], 1)
+        pools = [output_pool.get_stats()]
+        if video_processor:
+            pools.insert(0, video_processor.frame_pool.get_stats())
+        copied_bytes = sum(pool["copied_bytes"] for pool in pools)
+        return jsonify({
+            "success": True,
+            "data": {
+                "stream": dict(stream_stats),
+                "detection": detection_worker.get_stats() if detection_worker else None,
+                "batching": detection_batcher.get_stats() if detection_batcher else None,
+                "annotation": dict(yolo_detector.renderer.stats) if yolo_detector else None,
+                "viewers": broadcaster.get_stats(),
+                "offload": offloader.get_stats(),
+                "vlm": vlm_pool.get_stats(),
+                "vlm_cache": qwen_client.cache.get_stats() if qwen_client and qwen_client.cache else None,
+                "vlm_coalescing": vlm_pool.get_coalescing_stats(),
+                "latency": latency.get_stats(),
+                "mjpeg": {
+                    "annotated": annotated_channel.subscriber_count(),
+                    "raw": raw_channel.subscriber_count()
+                },
+                "frame_pools": pools,
+                "copies_per_frame": sum(pool["copies"] for pool in pools) / frames,
+                "copied_bytes_per_frame": copied_bytes / frames
+            }
+        })
+    except Exception as e:
+        return jsonify({"success": False, "message": f"获取统计信息失败: {str(e)}"})
+
 @socketio.on('connect')
+@latency.timed('socket:connect')
 def handle_connect():
     """客户端连接"""
     print('客户端已连接')
     emit('status', {'message': '连接成功'})
 
 @socketio.on('disconnect')
+@latency.timed('socket:disconnect')
 def handle_disconnect():
     """客户端断开连接"""
     print('客户端已断开连接')
+    unregister_viewer(request.sid)
+    vlm_pool.cancel(request.sid)
+
+@socketio.on('subscribe_stream')
+@latency.timed('socket:subscribe_stream')
+def handle_subscribe_stream(data=None):
+    """
+    客户端订阅视频流
+    
+    Args:
+        data: 可选，{"overlay": "server" | "client"}，client表示接收原始画面并在浏览器绘制检测框
+    """
+    overlay = (data or {}).get('overlay') or Config.STREAM_OVERLAY_MODE
+    if overlay not in ('server', 'client'):
+        overlay = 'server'
+    join_room(VIEWER_ROOM)
+    register_viewer(request.sid, overlay)
+    if overlay == 'client':
+        join_room(OVERLAY_ROOM)
+        # 立即发送当前检测结果，无需等待下一次检测
+        result = detection_worker.get_latest_result() if detection_worker else detection_results
+        if current_frame_handle is not None and result:
+            emit('detection_update', build_detection_update(result, current_frame_handle.shape))
+    else:
+        leave_room(OVERLAY_ROOM)
+    print(f'👀 观众订阅视频流，当前观众数: {viewer_count()}')
+
+@socketio.on('unsubscribe_stream')
+@latency.timed('socket:unsubscribe_stream')
+def handle_unsubscribe_stream():
+    """客户端取消订阅视频流"""
+    leave_room(VIEWER_ROOM)
+    leave_room(OVERLAY_ROOM)
+    unregister_viewer(request.sid)
+    print(f'💤 观众取消订阅视频流，当前观众数: {viewer_count()}')
+
+def vlm_request_key(event, use_cache, handle, question, detections):
+    """
+    VLM请求的合并键（感知哈希在线程池中计算，直通模式下的解码同样不占用hub）
+    
+    完整提示词只在任务中构建；合并键只含事件、是否使用缓存、规范化问题、检测摘要和画面哈希
+    
+    Returns:
+        tuple: (文本键, 感知哈希)，计算失败时返回None（不合并）
+    """
+    try:
+        text_key, image_hash = offloader.run(lambda: qwen_client.request_key(handle.frame, question, detections))
+    except Exception as e:
+        print(f"⚠️  计算请求合并键失败，不合并该请求: {e}")
+        return None
+    return (event, use_cache) + text_key, image_hash
+
+def answer_question_job(handle, question, detections, use_cache=True):
+    """
+    问答任务（在VLM任务池中执行）
+    
+    流式模式下每收到一段文本产出一个ai_response_delta，最后产出完整的ai_response
+    
+    Yields:
+        tuple: (事件名, 事件数据)
+    """
+    try:
+        print(f"🤖 开始调用AI模型分析问题: {question}")
+        
+        # 使用Qwen分析提交时的帧
+        if Config.VLM_STREAMING:
+            chunks = []
+            for delta in qwen_client.answer_question_stream(handle.frame, question, detections, use_cache):
+                chunks.append(delta)
+                yield 'ai_response_delta', {'question': question, 'delta': delta}
+            response = ''.join(chunks)
+        else:
+            response = qwen_client.answer_question(handle.frame, question, detections, use_cache)
+        
+        print(f"✅ AI回答生成成功: {response[:100]}...")
+        
+        yield 'ai_response', {
+            'question': question,
+            'answer': response,
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        
+    except Exception as e:
+        print(f"❌ 处理问题时出错: {e}")
+        import traceback
+        traceback.print_exc()
+        yield 'ai_response', {'error': f'处理问题时出错: {str(e)}'}
 
 @socketio.on('ask_question')
+@latency.timed('socket:ask_question')
 def handle_question(data):
-    """处理用户问题"""
+    """处理用户问题（提交到VLM任务池，回答就绪后发送ai_response）"""
     try:
         print(f"📥 收到问题请求: {data}")
         question = data.get('question', '')
+        # use_cache为false时跳过响应缓存，强制重新分析
+        use_cache = data.get('use_cache', True) is not False
         
         if not question:
             print("❌ 问题为空")
             emit('ai_response', {'error': '问题不能为空'})
             return
         
-        if current_frame is None:
+        handle = acquire_current_frame()
+        if handle is None:
             print("❌ 当前没有视频帧")
             emit('ai_response', {'error': '当前没有可用的视频帧'})
             return
         
-        print(f"🤖 开始调用AI模型分析问题: {question}")
+        # 任务持有帧句柄直到执行结束，检测结果取提交时的快照；
+        # 同一帧上的相同请求合并为一次调用，回答发给所有提问的客户端
+        key = vlm_request_key('ai_response', use_cache, handle, question, detection_results)
+        if not vlm_pool.submit(request.sid, 'ai_response', answer_question_job,
+                               handle, question, detection_results, use_cache,
+                               release=handle.release, key=key):
+            emit('ai_response', {'error': '请求过多，请等待之前的问题回答完成'})
         
-        # 使用Qwen分析当前帧
-        response = qwen_client.answer_question(
-            current_frame, 
-            question, 
-            detection_results
-        )
+    except Exception as e:
+        print(f"❌ 处理问题时出错: {e}")
+        import traceback
+        traceback.print_exc()
+        emit('ai_response', {'error': f'处理问题时出错: {str(e)}'})
+
+def analyze_scene_job(handle, detections, use_cache=True):
+    """
+    场景分析任务（在VLM任务池中执行）
+    
+    Returns:
+        dict: scene_analysis事件数据
+    """
+    try:
+        print("🤖 调用AI进行场景描述与安全检查...")
+        # 一次调用同时获取场景描述和安全评估
+        analysis = qwen_client.analyze_scene(handle.frame, detections, use_cache)
         
-        print(f"✅ AI回答生成成功: {response[:100]}...")
+        print("✅ 场景分析完成")
         
-        response_data = {
-            'question': question,
-            'answer': response,
+        return {
+            'description': analysis['description'],
+            'safety': analysis['safety'],
+            'detection_summary': yolo_detector.get_detection_summary(
+                detections.get('objects', []) if detections else []
+            ),
             'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         
-        print(f"📤 发送AI回答到前端")
-        emit('ai_response', response_data)
-        
     except Exception as e:
-        print(f"❌ 处理问题时出错: {e}")
+        print(f"❌ 场景分析时出错: {e}")
         import traceback
         traceback.print_exc()
-        emit('ai_response', {'error': f'处理问题时出错: {str(e)}'})
+        return {'error': f'场景分析时出错: {str(e)}'}
 
 @socketio.on('analyze_scene')
-def handle_scene_analysis():
-    """场景分析"""
+@latency.timed('socket:analyze_scene')
+def handle_scene_analysis(data=None):
+    """
+    场景分析（提交到VLM任务池，完成后发送scene_analysis）
+    
+    Args:
+        data: 可选，{"use_cache": false} 跳过响应缓存
+    """
     try:
         print("🔍 开始场景分析...")
         
-        if current_frame is None:
+        handle = acquire_current_frame()
+        if handle is None:
             print("❌ 当前没有视频帧")
             emit('scene_analysis', {'error': '当前没有可用的视频帧'})
             return
         
-        print("🤖 调用AI进行场景描述...")
-        # 获取场景描述
-        description = qwen_client.get_scene_description(current_frame, detection_results)
-        
-        print("🛡️ 进行安全检查...")
-        # 安全检查
-        safety_check = qwen_client.check_safety(current_frame, detection_results)
-        
-        print("✅ 场景分析完成")
-        
-        emit('scene_analysis', {
-            'description': description,
-            'safety': safety_check,
-            'detection_summary': yolo_detector.get_detection_summary(
-                detection_results.get('objects', []) if detection_results else []
-            ),
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
+        use_cache = (data or {}).get('use_cache', True) is not False
+        key = vlm_request_key('scene_analysis', use_cache, handle, SCENE_ANALYSIS_QUESTION, detection_results)
+        if not vlm_pool.submit(request.sid, 'scene_analysis', analyze_scene_job,
+                               handle, detection_results, use_cache,
+                               release=handle.release, key=key):
+            emit('scene_analysis', {'error': '请求过多，请等待之前的分析完成'})
         
     except Exception as e:
         print(f"❌ 场景分析时出错: {e}")
@@ -276,11 +902,24 @@ def handle_scene_analysis():
         traceback.print_exc()
         emit('scene_analysis', {'error': f'场景分析时出错: {str(e)}'})
 
+def save_capture(handle, path):
+    """
+    为帧添加时间戳、保存到文件并生成base64预览（在线程池中执行）
+    
+    Returns:
+        str: base64编码的图像
+    """
+    timestamped_frame = add_timestamp(handle.frame)
+    cv2.imwrite(path, timestamped_frame)
+    return image_to_base64(timestamped_frame)
+
 @socketio.on('capture_image')
+@latency.timed('socket:capture_image')
 def handle_capture():
     """捕获当前图像"""
     try:
-        if current_frame is None:
+        handle = acquire_current_frame()
+        if handle is None:
             emit('image_captured', {'error': '当前没有可用的视频帧'})
             return
         
@@ -288,12 +927,9 @@ def handle_capture():
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"capture_{timestamp}.jpg"
         
-        # 添加时间戳到图像
-        timestamped_frame = add_timestamp(current_frame)
-        cv2.imwrite(f"static/captures/{filename}", timestamped_frame)
-        
-        # 转换为base64用于显示
-        image_base64 = image_to_base64(timestamped_frame)
+        # 添加时间戳、写文件、转换为base64用于显示（卸载到线程池）
+        with handle:
+            image_base64 = offloader.run(save_capture, handle, f"static/captures/{filename}")
         
         emit('image_captured', {
             'filename': filename,
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+YOLO推理后端对比 - 在固定图像集上比较各后端的延迟与精度（以torch结果为参考）
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from config import Config
+from models.tracker import box_iou
+from models.yolo_backends import BACKENDS, resolve_model_path, warmup
+from models.yolo_detector import parse_yolo_result
+
+
+def load_images(image_dir):
+    """加载图像集，未指定目录时使用ultralytics自带的示例图像"""
+    if image_dir is None:
+        import ultralytics
+        image_dir = os.path.join(os.path.dirname(ultralytics.__file__), "assets")
+
+    paths = sorted(
+        path for ext in ("*.jpg", "*.jpeg", "*.png")
+        for path in glob.glob(os.path.join(image_dir, ext))
+    )
+    images = [(os.path.basename(path), cv2.imread(path)) for path in paths]
+    return [(name, image) for name, image in images if image is not None]
+
+
+def run_backend(backend, int8, images, runs):
+    """
+    运行单个后端
+
+    Returns:
+        tuple: (每张图像的检测结果列表, 所有推理耗时毫秒列表)
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(resolve_model_path(backend, int8), task="detect")
+    warmup(model)
+
+    detections = []
+    latencies = []
+    for _, image in images:
+        for run in range(runs):
+            start = time.perf_counter()
+            results = model(
+                image,
+                imgsz=Config.YOLO_IMAGE_SIZE,
+                conf=Config.CONFIDENCE_THRESHOLD,
+                iou=Config.IOU_THRESHOLD,
+                verbose=False
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+        detections.append(parse_yolo_result(results[0]) if results else [])
+    return detections, latencies
+
+
+def agreement(reference, candidate, iou_threshold=0.5):
+    """
+    以参考结果为真值计算精确率与召回率（同类别且IoU≥阈值视为匹配）
+
+    Returns:
+        tuple: (precision, recall)
+    """
+    matched = 0
+    total_ref = 0
+    total_cand = 0
+    for ref_objects, cand_objects in zip(reference, candidate):
+        total_ref += len(ref_objects)
+        total_cand += len(cand_objects)
+        used = set()
+        for ref in ref_objects:
+            for index, cand in enumerate(cand_objects):
+                if index in used or cand["class"] != ref["class"]:
+                    continue
+                if box_iou(ref["bbox"], cand["bbox"]) >= iou_threshold:
+                    used.add(index)
+                    matched += 1
+                    break
+    precision = matched / total_cand if total_cand else 1.0
+    recall = matched / total_ref if total_ref else 1.0
+    return precision, recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YOLO推理后端延迟/精度对比")
+    parser.add_argument("--images", default=None, help="图像目录（默认使用ultralytics示例图像）")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="要比较的后端，逗号分隔")
+    parser.add_argument("--int8", action="store_true", help="额外测试INT8量化模型")
+    parser.add_argument("--runs", type=int, default=10, help="每张图像的推理次数")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print("❌ 未找到测试图像")
+        sys.exit(1)
+    print(f"📷 测试图像: {len(images)} 张, 每张 {args.runs} 次, 输入尺寸 {Config.YOLO_IMAGE_SIZE}")
+
+    variants = []
+    for backend in args.backends.split(","):
+        variants.append((backend.strip(), False))
+        if args.int8 and backend.strip() != "torch":
+            variants.append((backend.strip(), True))
+
+    reference = None
+    rows = []
+    for backend, int8 in variants:
+        name = f"{backend}{'-int8' if int8 else ''}"
+        try:
+            detections, latencies = run_backend(backend, int8, images, args.runs)
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+            continue
+        if reference is None:
+            reference = detections
+        precision, recall = agreement(reference, detections)
+        rows.append((name, np.mean(latencies), np.percentile(latencies, 95), precision, recall))
+
+    print("\n" + "=" * 72)
+    print(f"{'后端':<20}{'平均(ms)':>12}{'P95(ms)':>12}{'精确率':>12}{'召回率':>12}")
+    print("-" * 72)
+    for name, mean_ms, p95_ms, precision, recall in rows:
+        print(f"{name:<20}{mean_ms:>12.1f}{p95_ms:>12.1f}{precision:>12.3f}{recall:>12.3f}")
+    print("=" * 72)
+    print("精确率/召回率以第一个后端（默认torch）的检测结果为参考")
+
+
+if __name__ == '__main__':
+    main()
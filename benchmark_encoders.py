@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+JPEG编码器微基准 - 对比各编码器在480p/720p/1080p下的耗时与输出大小
+"""
+import argparse
+import base64
+import io
+import sys
+import time
+import cv2
+import numpy as np
+from config import Config
+from utils.jpeg_encoder import ENCODERS, SUBSAMPLING_CHOICES, create_encoder
+
+RESOLUTIONS = [("480p", 854, 480), ("720p", 1280, 720), ("1080p", 1920, 1080)]
+
+
+class LegacyPILEncoder:
+    """优化前的路径：BGR→RGB、PIL保存到BytesIO（仅用于对比）"""
+
+    name = "pil(旧)"
+
+    def __init__(self):
+        from PIL import Image
+        self.Image = Image
+
+    def encode(self, image, quality):
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        buffer = io.BytesIO()
+        self.Image.fromarray(rgb).save(buffer, format="JPEG", quality=quality)
+        return buffer.getvalue()
+
+
+def make_test_frame(width, height, source=None):
+    """生成测试帧：指定图像缩放到目标尺寸，否则使用带噪声的合成画面"""
+    if source is not None:
+        return cv2.resize(source, (width, height), interpolation=cv2.INTER_AREA)
+
+    rng = np.random.RandomState(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    frame = np.dstack([
+        np.broadcast_to(x, (height, width)),
+        np.broadcast_to(y, (height, width)),
+        np.broadcast_to((x + y) / 2, (height, width))
+    ])
+    frame = frame + rng.normal(0, 12, frame.shape)
+    frame = np.clip(frame, 0, 255).astype(np.uint8)
+    for i in range(12):
+        cv2.rectangle(frame, tuple(rng.randint(0, width, 2)), tuple(rng.randint(0, height, 2)),
+                      tuple(int(c) for c in rng.randint(0, 255, 3)), -1)
+    return frame
+
+
+def benchmark(encoder, frame, quality, runs):
+    """
+    Returns:
+        tuple: (平均毫秒/帧, 字节/帧, base64后字节/帧)
+    """
+    encoder.encode(frame, quality)  # 预热
+    start = time.perf_counter()
+    for _ in range(runs):
+        data = encoder.encode(frame, quality)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / runs
+    return elapsed_ms, len(data), len(base64.b64encode(data))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JPEG编码器微基准")
+    parser.add_argument("--image", default=None, help="测试图像（默认使用合成画面）")
+    parser.add_argument("--quality", type=int, default=Config.STREAM_QUALITY, help="JPEG质量")
+    parser.add_argument("--subsampling", default=Config.JPEG_SUBSAMPLING, choices=SUBSAMPLING_CHOICES)
+    parser.add_argument("--no-fast-dct", action="store_true", help="关闭快速DCT")
+    parser.add_argument("--runs", type=int, default=50, help="每种组合的编码次数")
+    args = parser.parse_args()
+
+    source = None
+    if args.image:
+        source = cv2.imread(args.image)
+        if source is None:
+            print(f"❌ 无法读取图像: {args.image}")
+            sys.exit(1)
+
+    encoders = []
+    try:
+        encoders.append(LegacyPILEncoder())
+    except ImportError:
+        pass
+    for name in ENCODERS:
+        try:
+            encoders.append(create_encoder(name, args.subsampling, not args.no_fast_dct))
+        except (ImportError, OSError, RuntimeError) as e:
+            print(f"⚠️  跳过 {name}: {e}")
+
+    print(f"质量 {args.quality}, 色度抽样 {args.subsampling}, 快速DCT {'关' if args.no_fast_dct else '开'}, 每项 {args.runs} 次")
+    print("=" * 72)
+    print(f"{'分辨率':<10}{'编码器':<16}{'ms/帧':>10}{'字节/帧':>14}{'base64字节/帧':>18}")
+    print("-" * 72)
+    for label, width, height in RESOLUTIONS:
+        frame = make_test_frame(width, height, source)
+        for encoder in encoders:
+            ms, size, b64_size = benchmark(encoder, frame, args.quality, args.runs)
+            print(f"{label:<10}{encoder.name:<16}{ms:>10.2f}{size:>14,}{b64_size:>18,}")
+        print("-" * 72)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,26 +10,92 @@ class Config:
     HOST = '127.0.0.1'
     PORT = 5000
     
+    # 多worker部署配置（见 run_pipeline.py --web-workers，负载均衡需开启粘性会话）
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE', '')  # redis://host:6379/0 或 local://（进程内，测试用），为空表示单worker
+    SOCKETIO_CHANNEL = 'smart_vision'  # 消息队列频道前缀
+    STREAM_PRODUCER = os.environ.get('STREAM_PRODUCER', '1') == '1'  # 是否为推流worker（负责编码并向其他worker发布视频帧，只能有一个）
+    WORKER_ID = os.environ.get('WORKER_ID', '0')  # worker标识
+    
     # 阿里云百炼API配置
     DASHSCOPE_API_KEY = os.environ.get('DASHSCOPE_API_KEY') or 'sk-585c0caca85045f3b0dfa14b004bba5e'
     QWEN_MODEL = 'qwen-vl-plus'
+    VLM_MAX_IN_FLIGHT = 2  # 同时进行的VLM调用数上限（/api/stats 中的 vlm:wait 持续偏高时调大）
+    VLM_CLIENT_QUEUE_SIZE = 3  # 每个客户端最多排队的问答/分析请求数，超出时拒绝
+    VLM_STREAMING = True  # 问答使用增量输出，边生成边以ai_response_delta推送给浏览器
+    VLM_CACHE_ENABLED = True  # 画面基本不变时重复的问题/场景分析直接返回缓存的回答
+    VLM_CACHE_SIZE = 128  # 最多缓存的回答数（LRU淘汰）
+    VLM_CACHE_TTL = 30.0  # 缓存有效期（秒）
+    VLM_CACHE_MAX_DISTANCE = 6  # 帧感知哈希（64位）的汉明距离不超过该值时视为同一画面
+    SCENE_ANALYSIS_COMBINED = True  # 场景分析用一次调用返回描述和安全评估（JSON），关闭或解析失败时并发执行两次调用
     
     # YOLO模型配置
     YOLO_MODEL_PATH = 'yolov8n.pt'  # 将自动下载
+    YOLO_BACKEND = 'torch'  # 推理后端: torch / onnxruntime / openvino（CPU上后两者更快）
+    YOLO_INT8 = False  # 是否使用INT8量化模型（仅onnxruntime/openvino）
+    YOLO_EXPORT_DIR = 'model_cache'  # 导出模型的缓存目录
+    YOLO_IMAGE_SIZE = 640  # 推理输入尺寸
     CONFIDENCE_THRESHOLD = 0.5
     IOU_THRESHOLD = 0.45
+    YOLO_WORKERS = 0  # 多进程检测的进程数，0表示在主进程内推理
+    YOLO_RESULT_TIMEOUT = 10.0  # 多进程检测单帧结果的最长等待（秒），工作进程处理超时视为卡死并重启
+    DETECTION_MAX_BATCH = 8  # 批量推理每次前向传播的最大帧数
+    DETECTION_MAX_WAIT_MS = 10  # 微批处理凑批的最长等待时间（毫秒）
     
     # 视频处理配置
     CAMERA_INDEX = 0  # 默认摄像头
     FRAME_WIDTH = 1280  # 提升到720p
     FRAME_HEIGHT = 720
     FPS = 30
+    CAMERA_PASSTHROUGH = False  # MJPEG直通：保留摄像头的JPEG字节直接转发给原始画面观众，检测/问答需要时才解码
+    
+    # 多进程管线配置（run_pipeline.py：采集/检测/Web分进程运行，经共享内存帧总线共享帧）
+    FRAME_BUS_NAME = 'smart_vision_bus'  # 共享内存名称前缀
+    FRAME_BUS_SLOTS = 8  # 环形槽位数（读取方持有零拷贝帧的时间需小于 槽位数/FPS）
+    STAGE_HEARTBEAT_TIMEOUT = 15.0  # 阶段进程超过该秒数无心跳时重启
+    STAGE_STARTUP_TIMEOUT = 120.0  # 阶段进程启动（加载模型等）期间持续发送心跳的最长时间（秒），超过仍未完成视为卡死
+    STAGE_RESTART_DELAY = 2.0  # 阶段进程重启的最小间隔（秒）
     
     # 视频流优化配置
     STREAM_FPS = 20  # 流传输帧率（可以低于摄像头FPS以节省带宽）
+    DETECTION_FPS = 5  # 检测帧率（独立于流帧率，推理在后台线程中运行）
+    IDLE_DETECTION_FPS = 1  # 无人观看时的心跳检测帧率，0表示完全暂停检测
+    
+    # 运动门控配置（静态场景跳过YOLO推理）
+    MOTION_GATE_ENABLED = True
+    MOTION_SAMPLE_SIZE = (64, 36)  # 帧差比较使用的降采样尺寸 (宽, 高)
+    MOTION_PIXEL_DELTA = 15  # 灰度差超过该值的像素计为变化
+    MOTION_THRESHOLD = 0.01  # 变化像素比例超过该值时重新检测
+    MOTION_MAX_STALENESS = 5.0  # 最长复用检测结果的时间（秒）
+    
+    # 目标跟踪配置（检测间隔内外推框位置，分配稳定的track_id）
+    TRACKER_ENABLED = True
+    TRACKER_IOU_THRESHOLD = 0.3  # 匹配所需的最小IoU
+    TRACKER_MAX_MISSES = 3  # 连续未匹配多少次检测后删除轨迹
+    TRACKER_MAX_PREDICT = 1.0  # 最长外推时间（秒）
     STREAM_QUALITY = 85  # JPEG质量 (1-100)，提高质量
     MAX_FRAME_WIDTH = 1280  # 最大传输宽度
     MAX_FRAME_HEIGHT = 720  # 最大传输高度
+    STREAM_ANNOTATIONS = True  # 是否在视频流上绘制检测框（关闭后流中为原始画面）
+    STREAM_OVERLAY_MODE = 'server'  # 默认叠加模式: server（服务器绘制）/ client（发送原始画面，浏览器canvas绘制）
+    JPEG_ENCODER = 'auto'  # JPEG编码器: auto / opencv / simplejpeg / turbojpeg（benchmark_encoders.py可对比）
+    JPEG_SUBSAMPLING = '420'  # 色度抽样: 444 / 422 / 420
+    JPEG_FAST_DCT = True  # 快速DCT（仅libjpeg-turbo编码器，速度更快、画质略降）
+    
+    # 阻塞操作卸载配置（标注/编码/保存截图在原生线程池执行，不阻塞eventlet hub）
+    OFFLOAD_ENABLED = True  # 关闭后在hub上直接执行，可对比 /api/stats 中的延迟
+    OFFLOAD_MAX_IN_FLIGHT = 4  # 同时在线程池中执行的最大任务数
+    
+    # 自适应码率阶梯（按需编码，只编码有客户端订阅的档位；第一档受MAX_FRAME_WIDTH/HEIGHT限制）
+    STREAM_RENDITIONS = [
+        {"name": "720p", "width": 1280, "quality": 85},
+        {"name": "480p", "width": 854, "quality": 75},
+        {"name": "240p", "width": 426, "quality": 65},
+    ]
+    ADAPT_DOWN_LATENCY_MS = 250  # 传输耗时（确认延迟扣除往返时间）超过该值时降档
+    ADAPT_UP_LATENCY_MS = 80  # 传输耗时低于该值且几乎没有超出往返时间所能解释的丢帧时升档
+    ADAPT_DROP_RATIO = 0.3  # 超出往返时间所能解释的丢帧比例超过该值时降档
+    ADAPT_PROBE_INTERVAL = 2.0  # 往返时间探测间隔（秒）
+    ADAPT_COOLDOWN = 3.0  # 两次切换档位之间的最短间隔（秒）
     
     # 检测类别 (COCO数据集)
     COCO_CLASSES = [
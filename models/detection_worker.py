@@ -0,0 +1,253 @@
+"""
+检测工作线程 - 以独立的检测帧率在后台运行YOLO推理
+"""
+import threading
+import time
+from collections import deque
+from config import Config
+from utils.motion_gate import MotionGate
+from models.tracker import ObjectTracker
+
+
+class DetectionWorker:
+    def __init__(self, detector, video_processor, fps=None):
+        """
+        初始化检测工作线程
+
+        Args:
+            detector: YOLODetector实例
+            video_processor: VideoProcessor实例（帧来源）
+            fps: 检测帧率，默认使用配置文件中的DETECTION_FPS
+        """
+        self.detector = detector
+        self.video_processor = video_processor
+        self.fps = fps or Config.DETECTION_FPS
+        self.is_running = False
+        self.thread = None
+        # 无人观看时降为心跳检测帧率；恢复观看时通过wake_event立即唤醒
+        self.idle = False
+        self.wake_event = threading.Event()
+        self.result_lock = threading.Lock()
+        self.latest_result = {"objects": [], "object_count": 0, "seq": 0, "timestamp": None}
+        # 运动门控：静态画面复用上次检测结果
+        self.motion_gate = MotionGate() if Config.MOTION_GATE_ENABLED else None
+        # 跟踪器：分配稳定的track_id，并在两次检测之间外推框位置
+        self.tracker = ObjectTracker() if Config.TRACKER_ENABLED else None
+        self.stats = {
+            "detections": 0,
+            "reused": 0,
+            "discarded": 0,
+            "last_inference_ms": 0.0,
+            "avg_inference_ms": 0.0
+        }
+
+    def start(self):
+        """启动检测线程（原生线程，推理期间不阻塞eventlet hub）"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        print(f"✅ 检测线程已启动，检测帧率: {self.fps}fps")
+
+    def stop(self):
+        """停止检测线程"""
+        self.is_running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    def _run(self):
+        """检测循环：只处理最新帧，按检测帧率节流"""
+        last_seq = 0
+        # 多进程检测器支持异步提交：保持多帧在途，结果完成后按提交顺序立即发布
+        pipelined = hasattr(self.detector, "submit")
+        max_in_flight = getattr(self.detector, "workers", 1) if pipelined else 1
+        in_flight = deque()
+
+        while self.is_running:
+            try:
+                if not self.video_processor.is_camera_available() or not self.detector.is_model_ready():
+                    # 摄像头停止时发布剩余的在途结果
+                    self._collect(in_flight, keep=0)
+                    time.sleep(0.5)
+                    continue
+
+                interval = self._current_interval()
+                if interval is None:
+                    # 空闲且未开启心跳检测：发布剩余的在途结果后等待有观众订阅
+                    self._collect(in_flight, keep=0)
+                    self.wake_event.wait(0.5)
+                    self.wake_event.clear()
+                    continue
+
+                started = time.time()
+                packet = self.video_processor.wait_for_frame(last_seq, timeout=1.0)
+                if packet is None:
+                    continue
+
+                with packet["handle"] as handle:
+                    last_seq = packet["seq"]
+                    # 直通模式下在此（检测线程中）才解码像素
+                    frame = handle.frame
+                    # 画面无明显变化时复用上次结果，跳过推理
+                    if self.motion_gate and not self.motion_gate.should_detect(frame):
+                        self._reuse(packet["seq"], packet["timestamp"])
+                        self._throttle(started, interval)
+                        continue
+
+                    infer_start = time.time()
+                    if pipelined:
+                        job_id = self.detector.submit(frame)
+                    else:
+                        result = self.detector.detect_objects(frame, annotate=False)
+                    # 零拷贝帧（多进程管线的总线槽位）在推理或拷贝期间可能被采集进程覆盖，
+                    # 此时结果对应的是被撕裂的画面，不能发布
+                    if not handle.is_intact():
+                        if pipelined:
+                            self.detector.discard(job_id)
+                        self.stats["discarded"] += 1
+                        self._throttle(started, interval, in_flight)
+                        continue
+
+                if pipelined:
+                    in_flight.append((job_id, packet["seq"], packet["timestamp"], infer_start))
+                    # 在途数达到上限时等待最早的任务；空闲时（心跳频率很低）不保留在途任务
+                    self._collect(in_flight, keep=0 if self.idle else max_in_flight - 1)
+                else:
+                    inference_ms = (time.time() - infer_start) * 1000
+                    self._publish(result, packet["seq"], packet["timestamp"], inference_ms)
+
+                self._throttle(started, interval, in_flight)
+
+            except Exception as e:
+                print(f"❌ 检测线程出错: {e}")
+                for job_id, _, _, _ in in_flight:
+                    self.detector.discard(job_id)
+                in_flight.clear()
+                time.sleep(1)
+
+        self._collect(in_flight, keep=0)
+
+    def _collect(self, in_flight, keep=None):
+        """
+        按提交顺序发布已完成的在途检测结果
+
+        Args:
+            in_flight: 在途任务队列，元素为 (job_id, seq, timestamp, infer_start)
+            keep: 最多保留的在途任务数，超出时阻塞等待最早的任务完成；None表示只发布已完成的
+        """
+        while in_flight:
+            job_id, seq, timestamp, infer_start = in_flight[0]
+            if (keep is None or len(in_flight) <= keep) and not self.detector.is_done(job_id):
+                return
+            in_flight.popleft()
+            try:
+                objects = self.detector.result(job_id)
+            except (TimeoutError, RuntimeError) as e:
+                print(f"⚠️  检测任务失败: {e}")
+                continue
+            inference_ms = (time.time() - infer_start) * 1000
+            self._publish({"objects": objects}, seq, timestamp, inference_ms)
+
+    def _current_interval(self):
+        """当前检测间隔（秒），空闲且心跳关闭时返回None"""
+        if not self.idle:
+            return 1.0 / self.fps
+        if Config.IDLE_DETECTION_FPS <= 0:
+            return None
+        return 1.0 / Config.IDLE_DETECTION_FPS
+
+    def set_idle(self, idle):
+        """
+        设置空闲状态
+
+        Args:
+            idle: True表示无人观看，检测降为IDLE_DETECTION_FPS心跳
+        """
+        if self.idle == idle:
+            return
+        self.idle = idle
+        print(f"{'💤 无观众，检测降为心跳频率' if idle else '👀 有观众订阅，恢复正常检测'}")
+        if not idle:
+            self.wake_event.set()
+
+    def _throttle(self, started, interval, in_flight=None):
+        """
+        按检测帧率节流，剩余时间用于让出CPU（恢复观看时可被提前唤醒）
+
+        有在途任务时每10ms检查一次，结果完成后立即发布，不必等到下一次提交
+        """
+        while True:
+            if in_flight:
+                self._collect(in_flight)
+            remaining = interval - (time.time() - started)
+            if remaining <= 0:
+                return
+            if self.wake_event.wait(min(remaining, 0.01) if in_flight else remaining):
+                self.wake_event.clear()
+                return
+
+    def _reuse(self, seq, timestamp):
+        """画面无变化时沿用上次检测结果，仅更新帧序号"""
+        with self.result_lock:
+            objects = [dict(obj) for obj in self.latest_result["objects"]]
+            if self.tracker:
+                # 静态画面：轨迹速度直接清零，框停在原位（重复更新同样的框只会让速度减半，框仍会漂移）
+                self.tracker.hold(timestamp)
+            self.latest_result = dict(self.latest_result, objects=objects, seq=seq, timestamp=timestamp)
+            self.stats["reused"] += 1
+
+    def _publish(self, result, seq, timestamp, inference_ms):
+        """发布最新检测结果"""
+        objects = result.get("objects", [])
+        if self.tracker:
+            objects = self.tracker.update(objects, timestamp)
+        with self.result_lock:
+            self.latest_result = {
+                "objects": objects,
+                "object_count": len(objects),
+                "seq": seq,
+                "timestamp": timestamp
+            }
+            count = self.stats["detections"] + 1
+            self.stats["detections"] = count
+            self.stats["last_inference_ms"] = inference_ms
+            self.stats["avg_inference_ms"] += (inference_ms - self.stats["avg_inference_ms"]) / count
+
+    def get_latest_result(self):
+        """
+        获取最新检测结果
+
+        Returns:
+            dict: {"objects", "object_count", "seq", "timestamp"}
+        """
+        with self.result_lock:
+            return dict(self.latest_result)
+
+    def get_tracked_objects(self, timestamp):
+        """
+        获取指定帧时刻的对象框（启用跟踪时为外推位置）
+
+        Args:
+            timestamp: 帧捕获时间
+
+        Returns:
+            list: 对象列表，启用跟踪时包含track_id
+        """
+        if self.tracker:
+            return self.tracker.predict(timestamp)
+        with self.result_lock:
+            return list(self.latest_result["objects"])
+
+    def get_stats(self):
+        """获取检测线程统计信息"""
+        with self.result_lock:
+            stats = dict(self.stats)
+        stats["fps"] = self.fps
+        stats["idle"] = self.idle
+        if self.motion_gate:
+            stats["motion_gate"] = self.motion_gate.get_stats()
+            # 估算节省的推理时间：跳过次数 × 平均推理耗时
+            stats["saved_inference_ms"] = stats["reused"] * stats["avg_inference_ms"]
+        return stats
@@ -0,0 +1,91 @@
+"""
+微批处理器 - 将来自多个调用方的并发检测请求合并为一次批量推理
+"""
+import threading
+import time
+from config import Config
+
+
+class MicroBatcher:
+    def __init__(self, detector, max_batch_size=None, max_wait_ms=None):
+        """
+        初始化微批处理器
+
+        Args:
+            detector: 提供detect_batch的检测器
+            max_batch_size: 每批最大帧数，默认使用配置文件中的DETECTION_MAX_BATCH
+            max_wait_ms: 凑批最长等待毫秒数，默认使用配置文件中的DETECTION_MAX_WAIT_MS
+        """
+        self.detector = detector
+        self.max_batch_size = max_batch_size or Config.DETECTION_MAX_BATCH
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else Config.DETECTION_MAX_WAIT_MS) / 1000.0
+        self.condition = threading.Condition()
+        self.pending = []
+        self.is_running = True
+        self.stats = {"requests": 0, "batches": 0}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def detect(self, frame, timeout=None):
+        """
+        提交一帧并等待其检测结果（阻塞调用方，应在线程中调用）
+
+        Args:
+            frame: OpenCV图像帧
+            timeout: 最长等待秒数
+
+        Returns:
+            dict: 检测结果，格式与detect_objects(annotate=False)一致
+        """
+        request = {"frame": frame, "event": threading.Event(), "result": None}
+        with self.condition:
+            self.pending.append(request)
+            self.stats["requests"] += 1
+            self.condition.notify()
+
+        if not request["event"].wait(timeout):
+            raise TimeoutError("批量检测超时")
+        return request["result"]
+
+    def _run(self):
+        """凑批循环：达到最大批量或等待超时即执行一次批量推理"""
+        while self.is_running:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or not self.is_running)
+                deadline = time.time() + self.max_wait
+                while len(self.pending) < self.max_batch_size and self.is_running:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = self.pending[:self.max_batch_size]
+                del self.pending[:self.max_batch_size]
+
+            if not batch:
+                continue
+
+            try:
+                results = self.detector.detect_batch(
+                    [request["frame"] for request in batch],
+                    max_batch_size=self.max_batch_size
+                )
+            except Exception as e:
+                print(f"微批检测出错: {e}")
+                results = [{"objects": [], "object_count": 0} for _ in batch]
+
+            self.stats["batches"] += 1
+            for request, result in zip(batch, results):
+                request["result"] = result
+                request["event"].set()
+
+    def stop(self):
+        """停止凑批线程"""
+        with self.condition:
+            self.is_running = False
+            self.condition.notify_all()
+
+    def get_stats(self):
+        """获取凑批统计信息"""
+        stats = dict(self.stats)
+        stats["avg_batch_size"] = stats["requests"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
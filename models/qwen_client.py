@@ -4,16 +4,30 @@
 import dashscope
 import base64
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
 from io import BytesIO
 import cv2
+import eventlet
+from eventlet import patcher
 import numpy as np
+from utils.response_cache import ResponseCache, perceptual_hash, normalize_question, detection_key
+
+# 合并场景分析：一次调用同时返回场景描述和结构化的安全评估
+SCENE_ANALYSIS_QUESTION = """请分析这个场景，只输出如下JSON，不要输出其他内容：
+{"description": "详细的场景描述，包括环境、物体、人物活动等信息",
+ "safety": {"has_danger": true或false, "level": "低、中、高之一", "description": "安全隐患分析，没有隐患时说明理由"}}"""
+
+SAFETY_LEVELS = ("低", "中", "高")
 
 class QwenVLClient:
     def __init__(self):
         """初始化Qwen客户端"""
         dashscope.api_key = Config.DASHSCOPE_API_KEY
         self.model = Config.QWEN_MODEL
+        # 画面不变时重复的问题直接返回缓存的回答
+        self.cache = ResponseCache() if Config.VLM_CACHE_ENABLED else None
         
     def encode_image(self, image):
         """
@@ -35,7 +49,8 @@ class QwenVLClient:
             print(f"图像编码失败: {e}")
             return None
     
-    def analyze_image(self, image, question="请描述这张图片的内容", detection_info=None):
+    def analyze_image(self, image, question="请描述这张图片的内容", detection_info=None, image_base64=None,
+                      use_cache=True):
         """
         分析图像并回答问题
         
@@ -43,34 +58,24 @@ class QwenVLClient:
             image: OpenCV图像
             question: 用户问题
             detection_info: YOLO检测信息
+            image_base64: 已编码的图像（同一帧多次调用时复用，避免重复编码）
+            use_cache: 是否使用响应缓存（False时总是调用API，结果仍写入缓存）
             
         Returns:
             str: AI回答
         """
         try:
-            # 编码图像
-            image_base64 = self.encode_image(image)
-            if not image_base64:
-                return "图像处理失败，无法分析"
+            cache_key = self._cache_key(image, question, detection_info)
+            if use_cache and cache_key is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
             
-            # 构建提示词
-            prompt = self._build_prompt(question, detection_info)
-            
-            # 调用API
-            messages = [
-                {
-                    "role": "system",
-                    "content": Config.SYSTEM_PROMPT
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {"text": prompt},
-                        {"image": image_base64}
-                    ]
-                }
-            ]
+            messages = self._build_messages(image, question, detection_info, image_base64)
+            if messages is None:
+                return "图像处理失败，无法分析"
             
+            start = time.perf_counter()
             response = dashscope.MultiModalConversation.call(
                 model=self.model,
                 messages=messages,
@@ -81,7 +86,10 @@ class QwenVLClient:
             if response.status_code == 200:
                 raw_content = response.output.choices[0].message.content
                 # 解析并提取文本内容
-                return self._extract_text_from_response(raw_content)
+                text = self._extract_text_from_response(raw_content)
+                if cache_key is not None:
+                    self.cache.put(cache_key, text, (time.perf_counter() - start) * 1000)
+                return text
             else:
                 return f"API调用失败: {response.message}"
                 
@@ -89,6 +97,94 @@ class QwenVLClient:
             print(f"图像分析失败: {e}")
             return f"分析过程中出现错误: {str(e)}"
     
+    def analyze_image_stream(self, image, question="请描述这张图片的内容", detection_info=None, use_cache=True):
+        """
+        流式分析图像：使用增量输出，模型每生成一段文本就返回一段
+        
+        Args:
+            image: OpenCV图像
+            question: 用户问题
+            detection_info: YOLO检测信息
+            use_cache: 是否使用响应缓存（命中时整段回答作为一个片段返回）
+            
+        Yields:
+            str: 新生成的文本片段
+            
+        Raises:
+            RuntimeError: 图像处理或API调用失败
+        """
+        cache_key = self._cache_key(image, question, detection_info)
+        if use_cache and cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        messages = self._build_messages(image, question, detection_info)
+        if messages is None:
+            raise RuntimeError("图像处理失败，无法分析")
+        
+        start = time.perf_counter()
+        chunks = []
+        responses = dashscope.MultiModalConversation.call(
+            model=self.model,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=1000,
+            stream=True,
+            incremental_output=True
+        )
+        
+        for response in responses:
+            if response.status_code != 200:
+                raise RuntimeError(f"API调用失败: {response.message}")
+            content = response.output.choices[0].message.content
+            # 结束时的响应可能不含文本
+            if not content:
+                continue
+            text = self._extract_text_from_response(content)
+            if text:
+                chunks.append(text)
+                yield text
+        
+        if cache_key is not None and chunks:
+            self.cache.put(cache_key, ''.join(chunks), (time.perf_counter() - start) * 1000)
+    
+    def _cache_key(self, image, question, detection_info):
+        """生成响应缓存键，未启用缓存时返回None"""
+        if self.cache is None:
+            return None
+        return self.cache.make_key(image, question, detection_info)
+    
+    def _build_messages(self, image, question, detection_info, image_base64=None):
+        """
+        构建API请求消息（系统提示词 + 用户问题与图像）
+        
+        Returns:
+            list: 消息列表，图像编码失败时返回None
+        """
+        # 编码图像
+        image_base64 = image_base64 or self.encode_image(image)
+        if not image_base64:
+            return None
+        
+        # 构建提示词
+        prompt = self._build_prompt(question, detection_info)
+        
+        return [
+            {
+                "role": "system",
+                "content": Config.SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": [
+                    {"text": prompt},
+                    {"image": image_base64}
+                ]
+            }
+        ]
+    
     def _extract_text_from_response(self, content):
         """
         从API响应中提取纯文本
@@ -134,6 +230,23 @@ class QwenVLClient:
             print(f"提取文本失败: {e}")
             return str(content)
     
+    def request_key(self, image, question, detection_info=None):
+        """
+        请求合并的键：画面感知哈希 + 规范化问题 + 按类别统计的检测摘要
+        
+        帧序号和完整提示词（含每个物体的置信度）每帧都在变化，不能用于合并；
+        画面基本不变、问题和检测到的物体相同的请求得到的回答相同
+        
+        Args:
+            image: OpenCV图像
+            question: 用户问题（场景分析使用SCENE_ANALYSIS_QUESTION）
+            detection_info: 检测信息
+            
+        Returns:
+            tuple: ((规范化问题, 检测摘要), 感知哈希)，用same_request比较
+        """
+        return (normalize_question(question), detection_key(detection_info)), perceptual_hash(image)
+    
     def _build_prompt(self, question, detection_info):
         """
         构建包含检测信息的提示词
@@ -156,33 +269,37 @@ class QwenVLClient:
         prompt += "请结合图像内容和检测结果，用中文回答用户的问题。"
         return prompt
     
-    def get_scene_description(self, image, detection_info=None):
+    def get_scene_description(self, image, detection_info=None, image_base64=None, use_cache=True):
         """
         获取场景描述
         
         Args:
             image: OpenCV图像
             detection_info: 检测信息
+            image_base64: 已编码的图像（可选）
+            use_cache: 是否使用响应缓存
             
         Returns:
             str: 场景描述
         """
         question = "请详细描述这个场景，包括环境、物体、人物活动等信息。"
-        return self.analyze_image(image, question, detection_info)
+        return self.analyze_image(image, question, detection_info, image_base64, use_cache)
     
-    def check_safety(self, image, detection_info=None):
+    def check_safety(self, image, detection_info=None, image_base64=None, use_cache=True):
         """
-        安全检查
+        安全检查（自由文本回答，按关键词判断等级）
         
         Args:
             image: OpenCV图像
             detection_info: 检测信息
+            image_base64: 已编码的图像（可选）
+            use_cache: 是否使用响应缓存
             
         Returns:
             dict: 安全检查结果
         """
         question = "请分析这个场景是否存在安全隐患，如果有请详细说明。"
-        response = self.analyze_image(image, question, detection_info)
+        response = self.analyze_image(image, question, detection_info, image_base64, use_cache)
         
         # 简单的关键词检测来判断是否有安全问题
         danger_keywords = ["危险", "隐患", "不安全", "风险", "注意", "小心"]
@@ -194,7 +311,113 @@ class QwenVLClient:
             "level": "高" if "严重" in response or "紧急" in response else "中" if has_danger else "低"
         }
     
-    def answer_question(self, image, question, detection_info=None):
+    def analyze_scene(self, image, detection_info=None, use_cache=True):
+        """
+        场景分析：一次调用同时获取场景描述与安全评估（图像只编码、上传一次）
+        
+        合并调用失败或返回内容不是有效JSON时，改为并发执行场景描述和安全检查两次调用
+        
+        Args:
+            image: OpenCV图像
+            detection_info: 检测信息
+            use_cache: 是否使用响应缓存
+            
+        Returns:
+            dict: {"description": 场景描述, "safety": 安全检查结果}
+        """
+        cache_key = self._cache_key(image, SCENE_ANALYSIS_QUESTION, detection_info)
+        if use_cache and cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        image_base64 = self.encode_image(image)
+        if not image_base64:
+            return {
+                "description": "图像处理失败，无法分析",
+                "safety": {"has_danger": False, "description": "图像处理失败，无法分析", "level": "未知"}
+            }
+        
+        if Config.SCENE_ANALYSIS_COMBINED:
+            try:
+                messages = self._build_messages(image, SCENE_ANALYSIS_QUESTION, detection_info, image_base64)
+                start = time.perf_counter()
+                response = dashscope.MultiModalConversation.call(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=1500
+                )
+                if response.status_code != 200:
+                    raise RuntimeError(f"API调用失败: {response.message}")
+                text = self._extract_text_from_response(response.output.choices[0].message.content)
+                analysis = self._parse_scene_analysis(text)
+                if cache_key is not None:
+                    self.cache.put(cache_key, analysis, (time.perf_counter() - start) * 1000)
+                return analysis
+            except Exception as e:
+                print(f"⚠️  合并场景分析失败，改为分别调用: {e}")
+        
+        return self._analyze_scene_concurrently(image, detection_info, image_base64, use_cache)
+    
+    def _parse_scene_analysis(self, text):
+        """
+        解析合并场景分析返回的JSON（允许包裹在```json代码块中）
+        
+        Returns:
+            dict: {"description": 场景描述, "safety": 安全检查结果}
+            
+        Raises:
+            ValueError: 内容不是有效的JSON或缺少必要字段
+        """
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end < start:
+            raise ValueError("返回内容中没有JSON")
+        data = json.loads(text[start:end + 1])
+        
+        safety = data.get("safety")
+        if not isinstance(data.get("description"), str) or not isinstance(safety, dict):
+            raise ValueError("缺少description或safety字段")
+        level = str(safety.get("level", "")).strip()
+        if level not in SAFETY_LEVELS:
+            raise ValueError(f"无效的安全等级: {level}")
+        
+        has_danger = safety.get("has_danger")
+        if not isinstance(has_danger, bool):
+            has_danger = level != "低"
+        return {
+            "description": data["description"],
+            "safety": {
+                "has_danger": has_danger,
+                "description": str(safety.get("description", "")),
+                "level": level
+            }
+        }
+    
+    def _analyze_scene_concurrently(self, image, detection_info, image_base64, use_cache=True):
+        """并发执行场景描述和安全检查（共用已编码的图像）"""
+        calls = (
+            lambda: self.get_scene_description(image, detection_info, image_base64, use_cache),
+            lambda: self.check_safety(image, detection_info, image_base64, use_cache)
+        )
+        if patcher.is_monkey_patched("socket"):
+            # socket为协作式时调用方在greenthread中，原生线程不能使用绿色socket
+            description, safety = eventlet.GreenPool(len(calls)).imap(lambda call: call(), calls)
+        else:
+            with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+                description, safety = executor.map(lambda call: call(), calls)
+        return {"description": description, "safety": safety}
+    
+    def answer_question_stream(self, image, question, detection_info=None, use_cache=True):
+        """
+        流式回答关于图像的问题
+        
+        Yields:
+            str: 新生成的回答片段
+        """
+        return self.analyze_image_stream(image, question, detection_info, use_cache)
+    
+    def answer_question(self, image, question, detection_info=None, use_cache=True):
         """
         回答关于图像的问题
         
@@ -202,8 +425,9 @@ class QwenVLClient:
             image: OpenCV图像
             question: 用户问题
             detection_info: 检测信息
+            use_cache: 是否使用响应缓存
             
         Returns:
             str: AI回答
         """
-        return self.analyze_image(image, question, detection_info)
\ No newline at end of file
+        return self.analyze_image(image, question, detection_info, use_cache=use_cache)
\ No newline at end of file
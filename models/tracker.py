@@ -0,0 +1,173 @@
+"""
+轻量级多目标跟踪器 - 基于IoU/中心点匹配分配稳定的track_id，并在检测间隔内预测框位置
+"""
+import itertools
+import threading
+import numpy as np
+from config import Config
+
+
+def box_iou(a, b):
+    """
+    计算两个框的IoU
+
+    Args:
+        a, b: [x1, y1, x2, y2]
+
+    Returns:
+        float: 交并比
+    """
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    if inter <= 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+class ObjectTracker:
+    def __init__(self, iou_threshold=None, max_misses=None, max_predict=None):
+        """
+        初始化跟踪器
+
+        Args:
+            iou_threshold: 匹配所需的最小IoU
+            max_misses: 连续未匹配多少次后删除轨迹
+            max_predict: 最长外推时间（秒），超过后框停在最后位置
+        """
+        self.iou_threshold = iou_threshold if iou_threshold is not None else Config.TRACKER_IOU_THRESHOLD
+        self.max_misses = max_misses if max_misses is not None else Config.TRACKER_MAX_MISSES
+        self.max_predict = max_predict if max_predict is not None else Config.TRACKER_MAX_PREDICT
+        self.tracks = {}
+        self.track_ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def _match_score(self, track, obj):
+        """IoU优先；IoU不足时用中心点距离（相对框尺寸）兜底，适合快速移动的小目标"""
+        if track["class"] != obj["class"]:
+            return 0.0
+        iou = box_iou(track["bbox"], obj["bbox"])
+        if iou >= self.iou_threshold:
+            return 1.0 + iou
+        bbox = np.asarray(obj["bbox"], dtype=float)
+        size = max(bbox[2] - bbox[0], bbox[3] - bbox[1], 1.0)
+        center = (bbox[:2] + bbox[2:]) / 2
+        track_center = (track["bbox"][:2] + track["bbox"][2:]) / 2
+        distance = np.linalg.norm(center - track_center) / size
+        return 1.0 - distance if distance < 0.5 else 0.0
+
+    def update(self, objects, timestamp):
+        """
+        用新的检测结果更新轨迹，为每个对象写入track_id
+
+        Args:
+            objects: 检测对象列表（会被原地添加track_id字段）
+            timestamp: 检测帧的捕获时间
+
+        Returns:
+            list: 带track_id的对象列表
+        """
+        with self.lock:
+            # 贪心匹配：按得分从高到低分配
+            candidates = []
+            for track_id, track in self.tracks.items():
+                for index, obj in enumerate(objects):
+                    score = self._match_score(track, obj)
+                    if score > 0:
+                        candidates.append((score, track_id, index))
+            candidates.sort(reverse=True)
+
+            matched_tracks = set()
+            matched_objects = set()
+            for score, track_id, index in candidates:
+                if track_id in matched_tracks or index in matched_objects:
+                    continue
+                matched_tracks.add(track_id)
+                matched_objects.add(index)
+                self._update_track(self.tracks[track_id], objects[index], timestamp)
+                objects[index]["track_id"] = track_id
+
+            for index, obj in enumerate(objects):
+                if index in matched_objects:
+                    continue
+                track_id = next(self.track_ids)
+                self.tracks[track_id] = {
+                    "bbox": np.asarray(obj["bbox"], dtype=float),
+                    "velocity": np.zeros(4),
+                    "class": obj["class"],
+                    "class_id": obj.get("class_id", 0),
+                    "confidence": obj["confidence"],
+                    "last_seen": timestamp,
+                    "misses": 0
+                }
+                obj["track_id"] = track_id
+
+            for track_id in list(self.tracks):
+                if track_id in matched_tracks or self.tracks[track_id]["last_seen"] == timestamp:
+                    continue
+                track = self.tracks[track_id]
+                track["misses"] += 1
+                if track["misses"] > self.max_misses:
+                    del self.tracks[track_id]
+
+        return objects
+
+    def _update_track(self, track, obj, timestamp):
+        bbox = np.asarray(obj["bbox"], dtype=float)
+        dt = timestamp - track["last_seen"] if timestamp and track["last_seen"] else 0
+        if dt > 0:
+            # 指数平滑速度，抑制检测框抖动
+            velocity = (bbox - track["bbox"]) / dt
+            track["velocity"] = 0.5 * track["velocity"] + 0.5 * velocity
+        track["bbox"] = bbox
+        track["confidence"] = obj["confidence"]
+        track["last_seen"] = timestamp
+        track["misses"] = 0
+
+    def hold(self, timestamp):
+        """
+        画面静止时调用：当前可见的轨迹停在最后位置（速度清零），不再外推
+
+        Args:
+            timestamp: 复用检测结果的帧的捕获时间
+        """
+        with self.lock:
+            for track in self.tracks.values():
+                if track["misses"] > 0:
+                    continue
+                track["velocity"] = np.zeros(4)
+                track["last_seen"] = timestamp
+
+    def predict(self, timestamp):
+        """
+        预测指定时刻各轨迹的框位置（用于未运行检测的帧）
+
+        Args:
+            timestamp: 目标帧的捕获时间
+
+        Returns:
+            list: 对象列表，格式与detect_objects一致，附带track_id
+        """
+        objects = []
+        with self.lock:
+            for track_id, track in self.tracks.items():
+                if track["misses"] > 0:
+                    continue
+                dt = min(max(timestamp - track["last_seen"], 0.0), self.max_predict) if timestamp else 0.0
+                x1, y1, x2, y2 = (track["bbox"] + track["velocity"] * dt).astype(int).tolist()
+                objects.append({
+                    "class": track["class"],
+                    "confidence": track["confidence"],
+                    "bbox": [x1, y1, x2, y2],
+                    "center": [(x1 + x2) // 2, (y1 + y2) // 2],
+                    "class_id": track["class_id"],
+                    "track_id": track_id
+                })
+        return objects
+
+    def reset(self):
+        """清空所有轨迹"""
+        with self.lock:
+            self.tracks = {}
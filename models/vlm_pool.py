@@ -0,0 +1,254 @@
+"""
+VLM任务池 - 在有界并发的工作池中执行Qwen-VL调用，结果完成后发回发起请求的客户端
+
+每个客户端有独立的FIFO队列（同一客户端的请求按提交顺序依次执行，回答顺序与提问一致），
+各客户端的队首任务竞争全局并发名额，因此一个客户端连续提问不会占满整个池。
+
+任务函数可以是普通函数（返回值作为结果事件发送），也可以是生成器函数：
+生成器逐个产出 (event, data)，每产出一个立即发送（用于流式输出），生成器结束即任务完成。
+
+提交时可指定合并键（如 画面感知哈希 + 问题 + 检测摘要）：与尚未结束的任务匹配时，后到的请求不再入队、
+不占用并发名额，直接挂到该任务上，结果（包括已发送的流式片段）同时发给所有等待的客户端。
+合并的请求同样计入该客户端的排队上限，同一客户端重复提交的相同请求被拒绝。
+"""
+import inspect
+import time
+from collections import deque
+import eventlet
+from eventlet import patcher, tpool
+from eventlet.semaphore import Semaphore
+from config import Config
+
+
+class VLMWorkerPool:
+    def __init__(self, emit, max_in_flight=None, client_queue_size=None, recorder=None, key_match=None):
+        """
+        初始化VLM任务池
+
+        Args:
+            emit: 发送结果的函数 emit(event, data, sid)
+            max_in_flight: 同时进行的VLM调用数上限
+            client_queue_size: 每个客户端排队（含执行中和已合并）的最大任务数
+            recorder: LatencyRecorder实例，记录排队等待(vlm:wait)与调用耗时(vlm:call)
+            key_match: 判断两个合并键是否视为同一请求的函数 key_match(a, b)，默认要求完全相等
+        """
+        self.emit = emit
+        self.key_match = key_match
+        self.max_in_flight = max_in_flight or Config.VLM_MAX_IN_FLIGHT
+        self.client_queue_size = client_queue_size or Config.VLM_CLIENT_QUEUE_SIZE
+        self.recorder = recorder
+        self.semaphore = Semaphore(self.max_in_flight)
+        self.queues = {}
+        # 合并键 -> 尚未结束的任务
+        self.pending = {}
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "cancelled": 0, "in_flight": 0,
+                      "coalesced": 0}
+
+    def submit(self, sid, event, func, *args, release=None, key=None):
+        """
+        提交VLM任务，立即返回；任务完成后以event事件把func的返回值发给sid
+
+        Args:
+            sid: 发起请求的客户端会话ID
+            event: 结果事件名
+            func: 任务函数，返回要发送的数据（dict）；或生成器函数，产出 (event, data)
+            *args: 任务参数
+            release: 任务结束（完成、取消或被拒绝）后调用的清理函数，如释放帧句柄
+            key: 可选的合并键，与尚未结束的任务相同时合并到该任务，不再单独执行
+
+        Returns:
+            bool: 是否已入队（或已合并），该客户端队列已满或重复提交进行中的相同请求时返回False
+        """
+        leader = self._find_pending(key) if key is not None else None
+        queue = self.queues.get(sid)
+        # 同一客户端重复提交尚未完成的相同请求：拒绝，否则该客户端会收到两份结果和流式片段
+        duplicate = leader is not None and (
+            leader["sid"] == sid or any(follower["sid"] == sid for follower in leader["followers"])
+        )
+        if duplicate or self._client_load(sid, queue) >= self.client_queue_size:
+            self.stats["rejected"] += 1
+            if release:
+                release()
+            return False
+
+        if leader is not None:
+            self._follow(leader, sid, release)
+            return True
+
+        job = {"sid": sid, "event": event, "func": func, "args": args, "release": release,
+               "submitted": time.perf_counter(), "key": key, "followers": [], "history": []}
+        if key is not None:
+            self.pending[key] = job
+        self.stats["submitted"] += 1
+        if queue is None:
+            queue = self.queues[sid] = deque([job])
+            eventlet.spawn(self._drain, sid, queue)
+        else:
+            queue.append(job)
+        return True
+
+    def _find_pending(self, key):
+        """查找与合并键匹配的尚未结束的任务"""
+        job = self.pending.get(key)
+        if job is not None or self.key_match is None:
+            return job
+        for pending_key, job in self.pending.items():
+            if self.key_match(pending_key, key):
+                return job
+        return None
+
+    def _client_load(self, sid, queue):
+        """客户端排队（含执行中）和合并到其他任务上的请求数"""
+        following = sum(1 for job in self.pending.values() for follower in job["followers"] if follower["sid"] == sid)
+        return (len(queue) if queue is not None else 0) + following
+
+    def _follow(self, leader, sid, release):
+        """把请求合并到尚未结束的相同任务：补发已产出的流式片段，之后的结果与发起方同时发送"""
+        self.stats["coalesced"] += 1
+        leader["followers"].append({"sid": sid, "release": release})
+        for event, data in leader["history"]:
+            self.emit(event, data, sid)
+
+    def cancel(self, sid):
+        """丢弃客户端尚未开始的任务（客户端断开时调用），执行中的任务完成后结果被丢弃"""
+        # 该客户端合并到其他任务上的请求
+        for job in list(self.pending.values()):
+            for follower in [f for f in job["followers"] if f["sid"] == sid]:
+                job["followers"].remove(follower)
+                self.stats["cancelled"] += 1
+                if follower["release"]:
+                    follower["release"]()
+            if job.get("orphaned") and not job["followers"]:
+                # 发起方已断开，最后一个等待的客户端也已离开
+                job["cancelled"] = True
+                self._forget(job)
+
+        queue = self.queues.pop(sid, None)
+        if not queue:
+            return
+        # 有其他客户端等待结果的任务继续执行，只是不再发给该客户端
+        waiting = [job for job in list(queue)[1:] if job["followers"]]
+        while len(queue) > 1:
+            job = queue.pop()
+            if job["followers"]:
+                continue
+            self._forget(job)
+            self.stats["cancelled"] += 1
+            if job["release"]:
+                job["release"]()
+        queue.extend(waiting)
+        for job in queue:
+            job["orphaned"] = True
+        # 队首任务可能正在执行，由_drain负责清理；尚未拿到并发名额时直接跳过
+        if not queue[0]["followers"]:
+            queue[0]["cancelled"] = True
+            self._forget(queue[0])
+
+    def _forget(self, job):
+        """任务结束或取消后不再接受合并"""
+        if job["key"] is not None and self.pending.get(job["key"]) is job:
+            del self.pending[job["key"]]
+
+    def _drain(self, sid, queue):
+        """按顺序执行某个客户端的任务，队列清空后退出"""
+        while queue:
+            job = queue[0]
+            try:
+                self._run(sid, queue, job)
+            except Exception as e:
+                print(f"❌ VLM任务发送结果失败: {e}")
+            finally:
+                self._forget(job)
+                if job["release"]:
+                    job["release"]()
+                for follower in job["followers"]:
+                    if follower["release"]:
+                        follower["release"]()
+                queue.popleft()
+        if self.queues.get(sid) is queue:
+            del self.queues[sid]
+
+    def _run(self, sid, queue, job):
+        """等待并发名额后执行任务并发送结果（任务已取消时跳过，客户端已断开时丢弃结果）"""
+        def send(event, data):
+            # 结果事件之前的流式片段留给之后合并进来的客户端补发
+            job["history"].append((event, data))
+            if self.queues.get(sid) is queue:
+                self.emit(event, data, sid)
+            for follower in list(job["followers"]):
+                self.emit(event, data, follower["sid"])
+
+        with self.semaphore:
+            if job.get("cancelled"):
+                self.stats["cancelled"] += 1
+                return
+            started = time.perf_counter()
+            first_output = None
+            self.stats["in_flight"] += 1
+            try:
+                if inspect.isgeneratorfunction(job["func"]):
+                    for event, data in self._iterate(job["func"](*job["args"])):
+                        if first_output is None:
+                            first_output = time.perf_counter()
+                        send(event, data)
+                else:
+                    send(job["event"], self._execute(job["func"], *job["args"]))
+                self.stats["completed"] += 1
+            except Exception as e:
+                print(f"❌ VLM任务执行失败: {e}")
+                self.stats["failed"] += 1
+                send(job["event"], {"error": f"AI分析时出错: {str(e)}"})
+            finally:
+                self.stats["in_flight"] -= 1
+                if self.recorder:
+                    finished = time.perf_counter()
+                    self.recorder.record("vlm:wait", (started - job["submitted"]) * 1000)
+                    self.recorder.record("vlm:call", (finished - started) * 1000)
+                    if first_output is not None:
+                        self.recorder.record("vlm:first_output", (first_output - started) * 1000)
+
+    def _iterate(self, generator):
+        """逐步推进生成器，每一步都按_execute的方式执行，产出的数据回到当前greenthread发送"""
+        done = object()
+        while True:
+            item = self._execute(next, generator, done)
+            if item is done:
+                return
+            yield item
+
+    @staticmethod
+    def _execute(func, *args):
+        """
+        执行任务：默认在原生线程池中执行（HTTP请求与图像编码都不占用hub）；
+        socket已被patch为协作式时（Redis消息队列模式），原生线程中不能使用绿色socket，
+        改为在当前greenthread中执行，等待API响应时同样会让出hub
+        """
+        if patcher.is_monkey_patched("socket"):
+            return func(*args)
+        return tpool.execute(func, *args)
+
+    def get_coalescing_stats(self):
+        """
+        获取请求合并统计
+
+        Returns:
+            dict: calls为实际入队执行的任务数，coalesced为合并到进行中任务的请求数，in_flight为可被合并的未结束任务数
+        """
+        calls = self.stats["submitted"]
+        coalesced = self.stats["coalesced"]
+        requests = calls + coalesced
+        return {
+            "calls": calls,
+            "coalesced": coalesced,
+            "in_flight": len(self.pending),
+            "coalesce_rate": round(coalesced / requests, 3) if requests else 0.0
+        }
+
+    def get_stats(self):
+        """获取任务池统计"""
+        stats = dict(self.stats)
+        stats["max_in_flight"] = self.max_in_flight
+        stats["client_queue_size"] = self.client_queue_size
+        stats["clients"] = len(self.queues)
+        stats["queued"] = max(sum(len(queue) for queue in self.queues.values()) - stats["in_flight"], 0)
+        return stats
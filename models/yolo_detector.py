@@ -1,38 +1,91 @@
 """
 YOLO目标检测器
 """
-import cv2
 import numpy as np
 from ultralytics import YOLO
 from config import Config
+from models.yolo_backends import resolve_model_path, warmup
+from utils.annotation_renderer import AnnotationRenderer
 import threading
 import queue
 
+def parse_yolo_result(result):
+    """
+    将单张图像的ultralytics推理结果解析为对象列表
+    
+    Args:
+        result: model(...)返回列表中的一个元素
+        
+    Returns:
+        list: 检测对象列表
+    """
+    if result is None or result.boxes is None or len(result.boxes) == 0:
+        return []
+    
+    # 整批数组运算，避免逐框的numpy标量操作
+    boxes = result.boxes.xyxy.cpu().numpy().astype(int)
+    confidences = result.boxes.conf.cpu().numpy().astype(float)
+    class_ids = result.boxes.cls.cpu().numpy().astype(int)
+    centers = (boxes[:, :2] + boxes[:, 2:]) // 2
+    
+    num_classes = len(Config.COCO_CLASSES)
+    class_names = [
+        Config.COCO_CLASSES[class_id] if class_id < num_classes else f"class_{class_id}"
+        for class_id in class_ids.tolist()
+    ]
+    
+    return [
+        {
+            "class": class_name,
+            "confidence": confidence,
+            "bbox": bbox,
+            "center": center,
+            "class_id": class_id
+        }
+        for class_name, confidence, bbox, center, class_id in zip(
+            class_names, confidences.tolist(), boxes.tolist(), centers.tolist(), class_ids.tolist()
+        )
+    ]
+
 class YOLODetector:
-    def __init__(self):
-        """初始化YOLO检测器"""
+    def __init__(self, load=True):
+        """
+        初始化YOLO检测器
+        
+        Args:
+            load: 是否加载模型；多进程管线中Web进程只需要绘制与摘要功能，推理由检测进程负责
+        """
         self.model = None
+        self.backend = Config.YOLO_BACKEND
         self.is_loaded = False
+        # ultralytics的predictor保存每次调用的状态（输入源、批量、尺寸），不能被多个线程同时调用；
+        # 检测线程与微批处理线程（REST检测接口）共用同一个模型，推理需串行
+        self.infer_lock = threading.Lock()
         self.detection_queue = queue.Queue(maxsize=10)
-        self.load_model()
+        self.renderer = AnnotationRenderer()
+        if load:
+            self.load_model()
     
     def load_model(self):
         """加载YOLO模型"""
         try:
-            print("正在加载YOLO模型...")
-            self.model = YOLO(Config.YOLO_MODEL_PATH)
+            print(f"正在加载YOLO模型（后端: {self.backend}）...")
+            self.model = YOLO(resolve_model_path(self.backend), task="detect")
+            warmup(self.model)
             self.is_loaded = True
             print("YOLO模型加载成功!")
         except Exception as e:
             print(f"YOLO模型加载失败: {e}")
             self.is_loaded = False
     
-    def detect_objects(self, frame):
+    def detect_objects(self, frame, out=None, annotate=True):
         """
         检测图像中的物体
         
         Args:
-            frame: OpenCV图像帧
+            frame: OpenCV图像帧（可以是只读的共享帧）
+            out: 可选的预分配输出缓冲区，标注直接绘制在其中，避免额外分配
+            annotate: 是否生成标注图像，为False时只返回检测对象
             
         Returns:
             dict: 检测结果
@@ -42,66 +95,127 @@ class YOLODetector:
         
         try:
             # 运行检测
-            results = self.model(
-                frame,
-                conf=Config.CONFIDENCE_THRESHOLD,
-                iou=Config.IOU_THRESHOLD,
-                verbose=False
-            )
+            objects = self._infer(frame)
             
-            # 解析检测结果
-            objects = []
-            annotated_frame = frame.copy()
-            
-            if results and len(results) > 0:
-                result = results[0]
-                
-                # 绘制检测框和标签
-                if result.boxes is not None:
-                    boxes = result.boxes.xyxy.cpu().numpy()
-                    confidences = result.boxes.conf.cpu().numpy()
-                    class_ids = result.boxes.cls.cpu().numpy().astype(int)
-                    
-                    for i, (box, conf, class_id) in enumerate(zip(boxes, confidences, class_ids)):
-                        x1, y1, x2, y2 = map(int, box)
-                        
-                        # 获取类别名称
-                        class_name = Config.COCO_CLASSES[class_id] if class_id < len(Config.COCO_CLASSES) else f"class_{class_id}"
-                        
-                        # 添加到对象列表
-                        objects.append({
-                            "class": class_name,
-                            "confidence": float(conf),
-                            "bbox": [x1, y1, x2, y2],
-                            "center": [(x1 + x2) // 2, (y1 + y2) // 2]
-                        })
-                        
-                        # 绘制边界框
-                        color = self._get_color(class_id)
-                        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
-                        
-                        # 绘制标签
-                        label = f"{class_name}: {conf:.2f}"
-                        label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
-                        cv2.rectangle(annotated_frame, (x1, y1 - label_size[1] - 10), 
-                                    (x1 + label_size[0], y1), color, -1)
-                        cv2.putText(annotated_frame, label, (x1, y1 - 5), 
-                                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-            
-            return {
+            detection = {
                 "objects": objects,
-                "annotated_frame": annotated_frame,
                 "object_count": len(objects)
             }
             
+            if annotate:
+                if out is not None:
+                    np.copyto(out, frame)
+                    annotated_frame = out
+                else:
+                    annotated_frame = frame.copy()
+                # 绘制检测框和标签
+                self.draw_objects(annotated_frame, objects)
+                detection["annotated_frame"] = annotated_frame
+            
+            return detection
+            
         except Exception as e:
             print(f"检测过程中出错: {e}")
             return {"objects": [], "annotated_frame": frame, "object_count": 0}
     
+    def _infer(self, frame):
+        """
+        运行模型推理并解析结果
+        
+        Args:
+            frame: OpenCV图像帧
+            
+        Returns:
+            list: 检测对象列表
+        """
+        results = self._run_model(frame)
+        return parse_yolo_result(results[0]) if results else []
+    
+    def _infer_batch(self, frames):
+        """
+        一次前向传播推理多帧
+        
+        Args:
+            frames: 图像帧列表
+            
+        Returns:
+            list: 每帧的检测对象列表
+        """
+        if self.backend == "openvino":
+            # 导出的OpenVINO模型输入为固定批量1，逐帧推理
+            return [self._infer(frame) for frame in frames]
+        results = self._run_model(list(frames))
+        return [parse_yolo_result(result) for result in results]
+    
+    def _run_model(self, source):
+        """
+        调用模型推理（加锁串行执行）
+        
+        Args:
+            source: 单帧或帧列表
+            
+        Returns:
+            list: ultralytics推理结果
+        """
+        with self.infer_lock:
+            return self.model(
+                source,
+                imgsz=Config.YOLO_IMAGE_SIZE,
+                conf=Config.CONFIDENCE_THRESHOLD,
+                iou=Config.IOU_THRESHOLD,
+                verbose=False
+            )
+    
+    def detect_batch(self, frames, annotate=False, max_batch_size=None):
+        """
+        批量检测多帧图像，按max_batch_size分块，每块一次前向传播
+        
+        Args:
+            frames: 图像帧列表
+            annotate: 是否为每帧生成标注图像
+            max_batch_size: 每次前向传播的最大帧数，默认使用配置文件中的DETECTION_MAX_BATCH
+            
+        Returns:
+            list: 每帧的检测结果，格式与detect_objects一致
+        """
+        frames = list(frames)
+        if not self.is_loaded:
+            return [{"objects": [], "object_count": 0} for _ in frames]
+        
+        max_batch_size = max_batch_size or Config.DETECTION_MAX_BATCH
+        detections = []
+        for start in range(0, len(frames), max_batch_size):
+            chunk = frames[start:start + max_batch_size]
+            try:
+                batch_objects = self._infer_batch(chunk)
+            except Exception as e:
+                print(f"批量检测过程中出错: {e}")
+                batch_objects = [[] for _ in chunk]
+            
+            for frame, objects in zip(chunk, batch_objects):
+                detection = {"objects": objects, "object_count": len(objects)}
+                if annotate:
+                    detection["annotated_frame"] = self.draw_objects(frame.copy(), objects)
+                detections.append(detection)
+        
+        return detections
+    
+    def draw_objects(self, image, objects):
+        """
+        在图像上原地绘制检测框和标签
+        
+        Args:
+            image: 可写的OpenCV图像
+            objects: detect_objects返回的对象列表
+            
+        Returns:
+            numpy.ndarray: 绘制后的图像（即传入的image）
+        """
+        return self.renderer.draw(image, objects)
+    
     def _get_color(self, class_id):
-        """根据类别ID生成颜色"""
-        np.random.seed(class_id)
-        return tuple(map(int, np.random.randint(0, 255, 3)))
+        """根据类别ID获取颜色（预计算调色板）"""
+        return self.renderer.get_color(class_id)
     
     def get_detection_summary(self, objects):
         """
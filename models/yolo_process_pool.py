@@ -0,0 +1,349 @@
+"""
+多进程YOLO检测器 - 多个工作进程各自加载模型，帧通过共享内存传递
+"""
+import atexit
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from config import Config
+from models.yolo_detector import YOLODetector, parse_yolo_result
+from models.yolo_backends import resolve_model_path, warmup
+
+
+def _detector_worker(worker_id, model_path, task_queue, result_queue, threads):
+    """
+    工作进程入口：加载一次模型，循环处理共享内存中的帧
+
+    Args:
+        worker_id: 工作进程编号
+        model_path: 模型路径（已由主进程按后端导出）
+        task_queue: 任务队列，元素为 (job_id, slot_name, shape, dtype) 或 None（退出）
+        result_queue: 结果队列，元素为 (类型, worker_id, job_id, 数据, 错误)
+        threads: 每个进程使用的推理线程数
+    """
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    try:
+        from ultralytics import YOLO
+        model = YOLO(model_path, task="detect")
+        warmup(model)
+        result_queue.put(("ready", worker_id, None, True, None))
+    except Exception as e:
+        result_queue.put(("ready", worker_id, None, False, str(e)))
+        return
+
+    attached = {}
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        job_id, slot_name, shape, dtype = task
+        # 通知主进程本进程正在处理该任务，进程退出时主进程据此让任务失败
+        result_queue.put(("started", worker_id, job_id, None, None))
+        try:
+            shm = attached.get(slot_name)
+            if shm is None:
+                shm = shared_memory.SharedMemory(name=slot_name)
+                attached[slot_name] = shm
+            frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            results = model(
+                frame,
+                imgsz=Config.YOLO_IMAGE_SIZE,
+                conf=Config.CONFIDENCE_THRESHOLD,
+                iou=Config.IOU_THRESHOLD,
+                verbose=False
+            )
+            objects = parse_yolo_result(results[0]) if results else []
+            result_queue.put(("result", worker_id, job_id, objects, None))
+        except Exception as e:
+            result_queue.put(("result", worker_id, job_id, [], str(e)))
+
+    for shm in attached.values():
+        shm.close()
+
+
+class ProcessPoolYOLODetector(YOLODetector):
+    def __init__(self, workers=None):
+        """
+        初始化多进程检测器
+
+        Args:
+            workers: 工作进程数量，默认使用配置文件中的YOLO_WORKERS
+        """
+        self.workers = workers or Config.YOLO_WORKERS
+        self.result_timeout = Config.YOLO_RESULT_TIMEOUT
+        self.processes = []
+        # worker_id -> (job_id, 开始时间)，用于工作进程退出或卡死时让其任务失败
+        self.running = {}
+        self.closing = False
+        self.restarts = 0
+        self.slots = []
+        self.free_slots = queue.Queue()
+        self.pending = {}
+        self.pending_lock = threading.Condition()
+        self.job_ids = itertools.count(1)
+        self.collector = None
+        super().__init__()
+        atexit.register(self.close)
+
+    def load_model(self):
+        """启动工作进程，每个进程加载一次模型"""
+        try:
+            print(f"正在启动 {self.workers} 个YOLO检测进程...")
+            self.ctx = mp.get_context("spawn")
+            self.task_queue = self.ctx.Queue()
+            self.result_queue = self.ctx.Queue()
+            self.threads = max(1, (os.cpu_count() or 1) // self.workers)
+            # 在主进程中完成导出，避免多个工作进程同时导出
+            self.model_path = resolve_model_path(self.backend)
+
+            # 每个进程两个共享内存槽位：一个推理中，一个已写入等待
+            slot_bytes = Config.FRAME_WIDTH * Config.FRAME_HEIGHT * 3
+            for _ in range(self.workers * 2):
+                slot = shared_memory.SharedMemory(create=True, size=slot_bytes)
+                self.slots.append(slot)
+                self.free_slots.put(slot)
+
+            for worker_id in range(self.workers):
+                self.processes.append(self._start_worker(worker_id))
+
+            ready = 0
+            for _ in range(self.workers):
+                _, worker_id, _, ok, error = self.result_queue.get(timeout=300)
+                if ok:
+                    ready += 1
+                else:
+                    print(f"检测进程 {worker_id} 加载模型失败: {error}")
+
+            self.is_loaded = ready > 0
+            self.collector = threading.Thread(target=self._collect_results, daemon=True)
+            self.collector.start()
+            print(f"YOLO检测进程就绪: {ready}/{self.workers}")
+        except Exception as e:
+            print(f"YOLO检测进程启动失败: {e}")
+            self.is_loaded = False
+
+    def _start_worker(self, worker_id):
+        """启动一个工作进程"""
+        process = self.ctx.Process(
+            target=_detector_worker,
+            args=(worker_id, self.model_path, self.task_queue, self.result_queue, self.threads),
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def _collect_results(self):
+        """收集工作进程返回的结果并唤醒等待者，定期检查工作进程健康状态"""
+        last_check = time.time()
+        while not self.closing:
+            try:
+                kind, worker_id, job_id, objects, error = self.result_queue.get(timeout=1.0)
+            except queue.Empty:
+                kind = None
+            except (EOFError, OSError):
+                break
+
+            if kind == "started":
+                self.running[worker_id] = (job_id, time.time())
+            elif kind == "result":
+                self.running.pop(worker_id, None)
+                self._complete(job_id, objects, error)
+            elif kind == "ready":
+                print(f"{'✅' if objects else '❌'} 检测进程 {worker_id} 重启{'完成' if objects else f'后加载模型失败: {error}'}")
+
+            if time.time() - last_check >= 1.0:
+                self._check_workers()
+                last_check = time.time()
+
+    def _complete(self, job_id, objects, error):
+        """任务完成：归还共享内存槽位，唤醒等待者（已放弃的任务直接丢弃）"""
+        with self.pending_lock:
+            job = self.pending.get(job_id)
+            if job is None or job["done"]:
+                return
+            self.free_slots.put(job["slot"])
+            if job["abandoned"]:
+                del self.pending[job_id]
+                return
+            job["objects"] = objects
+            job["error"] = error
+            job["done"] = True
+            self.pending_lock.notify_all()
+
+    def _check_workers(self):
+        """工作进程退出时让其任务失败并重启；单个任务超过超时时间视为卡死，终止后重启"""
+        self._reap_lost_jobs()
+        for worker_id, process in enumerate(self.processes):
+            if self.closing:
+                return
+            running = self.running.get(worker_id)
+            if process.is_alive():
+                if running is None or time.time() - running[1] < self.result_timeout:
+                    continue
+                print(f"⚠️  检测进程 {worker_id} 处理任务超过 {self.result_timeout:.0f} 秒，正在终止...")
+                process.terminate()
+                process.join(timeout=5)
+            else:
+                process.join()
+                print(f"⚠️  检测进程 {worker_id} 已退出（exitcode={process.exitcode}）")
+
+            # 进程已退出，正在处理的帧槽位不会再被读取，可以安全回收
+            if running is not None:
+                self.running.pop(worker_id, None)
+                self._complete(running[0], [], f"检测进程 {worker_id} 退出")
+            self.restarts += 1
+            print(f"🔄 重启检测进程 {worker_id}（第 {self.restarts} 次）")
+            self.processes[worker_id] = self._start_worker(worker_id)
+
+    def _reap_lost_jobs(self):
+        """
+        回收丢失的任务：工作进程取出任务后、发出started之前退出时，该任务不会再有任何消息。
+        排队中的任务最多等待几次推理的时间，未开始且提交超过两倍超时时间的任务视为丢失，
+        让其失败并归还共享内存槽位，避免槽位耗尽后检测永久停止
+        """
+        running = {job_id for job_id, _ in self.running.values()}
+        deadline = time.time() - 2 * self.result_timeout
+        with self.pending_lock:
+            lost = [job_id for job_id, job in self.pending.items()
+                    if not job["done"] and job_id not in running and job["submitted"] < deadline]
+        for job_id in lost:
+            print(f"⚠️  检测任务 {job_id} 未被任何检测进程处理，已回收")
+            self._complete(job_id, [], f"检测任务 {job_id} 丢失（检测进程在开始处理前退出）")
+
+    def _acquire_slot(self, nbytes):
+        """获取一个足够大的共享内存槽位，分辨率变大时替换为更大的槽位"""
+        try:
+            slot = self.free_slots.get(timeout=self.result_timeout)
+        except queue.Empty:
+            raise TimeoutError("没有空闲的共享内存槽位（检测进程无响应）")
+        if slot.size < nbytes:
+            self.slots.remove(slot)
+            slot.close()
+            slot.unlink()
+            slot = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.slots.append(slot)
+        return slot
+
+    def submit(self, frame):
+        """
+        提交一帧进行检测（帧被写入共享内存，不经过pickle）
+
+        Args:
+            frame: OpenCV图像帧
+
+        Returns:
+            int: 任务ID
+        """
+        slot = self._acquire_slot(frame.nbytes)
+        shared = np.ndarray(frame.shape, dtype=frame.dtype, buffer=slot.buf)
+        np.copyto(shared, frame)
+
+        job_id = next(self.job_ids)
+        with self.pending_lock:
+            self.pending[job_id] = {"slot": slot, "done": False, "abandoned": False, "objects": [], "error": None,
+                                    "submitted": time.time()}
+        self.task_queue.put((job_id, slot.name, frame.shape, frame.dtype.str))
+        return job_id
+
+    def result(self, job_id, timeout=None):
+        """
+        等待指定任务的检测结果
+
+        Args:
+            job_id: submit返回的任务ID
+            timeout: 最长等待秒数，默认使用配置文件中的YOLO_RESULT_TIMEOUT
+
+        Returns:
+            list: 检测对象列表
+
+        Raises:
+            TimeoutError: 超时（任务被放弃，结果到达后丢弃）
+            RuntimeError: 推理失败、工作进程退出或任务已被放弃
+        """
+        timeout = self.result_timeout if timeout is None else timeout
+        with self.pending_lock:
+            job = self.pending.get(job_id)
+            if job is None:
+                raise RuntimeError(f"检测任务 {job_id} 不存在或已被放弃")
+            if not self.pending_lock.wait_for(lambda: job["done"], timeout=timeout):
+                job["abandoned"] = True
+                raise TimeoutError(f"检测任务 {job_id} 超时")
+            self.pending.pop(job_id, None)
+        if job["error"]:
+            raise RuntimeError(job["error"])
+        return job["objects"]
+
+    def is_done(self, job_id):
+        """任务是否已完成（不阻塞）"""
+        with self.pending_lock:
+            job = self.pending.get(job_id)
+            return job is None or job["done"]
+
+    def discard(self, job_id):
+        """放弃任务：已完成的直接移除，未完成的在结果到达（或工作进程退出）时回收槽位"""
+        with self.pending_lock:
+            job = self.pending.get(job_id)
+            if job is None:
+                return
+            if job["done"]:
+                del self.pending[job_id]
+            else:
+                job["abandoned"] = True
+
+    def detect_many(self, frames):
+        """
+        并行检测多帧，按提交顺序返回结果
+
+        Args:
+            frames: 图像帧列表
+
+        Returns:
+            list: 每帧的检测结果，格式与detect_objects(annotate=False)一致
+        """
+        job_ids = []
+        try:
+            for frame in frames:
+                job_ids.append(self.submit(frame))
+            detections = []
+            for job_id in job_ids:
+                objects = self.result(job_id)
+                detections.append({"objects": objects, "object_count": len(objects)})
+            return detections
+        except Exception:
+            for job_id in job_ids:
+                self.discard(job_id)
+            raise
+
+    def _infer(self, frame):
+        """在工作进程中运行推理"""
+        return self.result(self.submit(frame))
+
+    def _infer_batch(self, frames):
+        """将一批帧分发到各工作进程并行推理，按提交顺序返回"""
+        return [detection["objects"] for detection in self.detect_many(frames)]
+
+    def close(self):
+        """停止工作进程并释放共享内存"""
+        self.closing = True
+        for _ in self.processes:
+            self.task_queue.put(None)
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        for slot in self.slots:
+            slot.close()
+            slot.unlink()
+        self.slots = []
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 """
-智能视觉分析助手启动脚本
+智能视觉分析助手启动脚本（单进程、单worker）
+
+需要多个Web worker承载更多观众时，请使用：
+    python run_pipeline.py --web-workers N --message-queue redis://127.0.0.1:6379/0
+并在负载均衡（如nginx的ip_hash）上开启粘性会话，保证同一客户端始终落到同一个worker。
 """
 import os
 import sys
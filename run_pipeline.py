@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+多进程管线启动脚本 - 采集、检测、Web服务分别运行在独立进程中，通过共享内存帧总线共享帧
+
+    python run_pipeline.py [--host 0.0.0.0] [--port 5000]
+
+监督进程创建帧总线并启动各阶段进程，进程退出或心跳超时时自动重启该阶段，
+其余阶段不受影响（例如YOLO卡住或崩溃时Web界面仍可访问）。
+
+多个Web worker（观众数超过单进程能力时）：
+
+    python run_pipeline.py --web-workers 4 --message-queue redis://127.0.0.1:6379/0
+
+worker i 监听 port+i。worker 0 为推流worker：每帧每个档位只编码一次，
+每个（叠加模式, 档位）组合经消息队列只发布一次，各worker再分发给自己的观众；
+其他worker向它上报本worker正在使用的组合。
+负载均衡必须开启粘性会话（同一客户端始终落到同一个worker），
+否则Socket.IO的HTTP长轮询请求会落到不认识该会话的worker上。nginx示例：
+
+    upstream smart_vision {
+        ip_hash;
+        server 127.0.0.1:5000;
+        server 127.0.0.1:5001;
+        server 127.0.0.1:5002;
+        server 127.0.0.1:5003;
+    }
+    location /socket.io {
+        proxy_pass http://smart_vision/socket.io;
+        proxy_http_version 1.1;
+        proxy_set_header Upgrade $http_upgrade;
+        proxy_set_header Connection "Upgrade";
+    }
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from config import Config
+from utils.frame_bus import FrameBus, MAX_WEB_WORKERS
+
+
+def startup_heartbeat(bus, stage):
+    """
+    启动期间（加载模型等）在后台线程中持续发送心跳，避免监督进程把慢启动误判为卡死而反复重启；
+    超过STAGE_STARTUP_TIMEOUT仍未完成启动时停止发送，由心跳超时触发重启
+
+    Returns:
+        threading.Event: 启动完成后调用其set()停止后台心跳
+    """
+    started = threading.Event()
+    deadline = time.time() + Config.STAGE_STARTUP_TIMEOUT
+
+    def run():
+        while not started.is_set() and time.time() < deadline:
+            bus.heartbeat(stage)
+            started.wait(1.0)
+
+    threading.Thread(target=run, daemon=True).start()
+    return started
+
+
+def capture_stage(bus_name):
+    """采集进程：按控制通道的请求打开/关闭摄像头，把最新帧写入总线"""
+    from utils.video_processor import VideoProcessor
+
+    bus = FrameBus(bus_name)
+    processor = VideoProcessor()
+    last_seq = 0
+    print(f"📷 采集进程已启动 (pid={os.getpid()})")
+
+    while True:
+        bus.heartbeat("capture")
+        wanted = bus.get_flag("capture_enabled")
+        if wanted and not processor.is_camera_available():
+            if processor.is_running:
+                processor.stop_capture()
+            if not processor.start_capture():
+                time.sleep(1)
+                continue
+        elif not wanted and processor.is_running:
+            processor.stop_capture()
+        bus.set_flag("camera_running", processor.is_camera_available())
+
+        if not processor.is_camera_available():
+            time.sleep(0.2)
+            continue
+
+        packet = processor.wait_for_frame(last_seq, timeout=0.5)
+        if packet is None:
+            continue
+        with packet["handle"] as handle:
+            last_seq = packet["seq"]
+            bus.write(handle.frame, packet["timestamp"])
+
+
+def detection_stage(bus_name):
+    """检测进程：零拷贝读取总线上的最新帧运行YOLO，把结果发布到控制通道"""
+    from models.detection_worker import DetectionWorker
+    from models.yolo_detector import YOLODetector
+    from models.yolo_process_pool import ProcessPoolYOLODetector
+    from utils.frame_bus import BusVideoSource
+
+    # 监督进程以SIGTERM终止本进程时正常退出，关闭YOLO工作进程池
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    bus = FrameBus(bus_name)
+    source = BusVideoSource(bus, zero_copy=True)
+    started = startup_heartbeat(bus, "detection")
+    if Config.YOLO_WORKERS > 0:
+        detector = ProcessPoolYOLODetector(Config.YOLO_WORKERS)
+    else:
+        detector = YOLODetector()
+    worker = DetectionWorker(detector, source)
+    worker.start()
+    started.set()
+    print(f"🔍 检测进程已启动 (pid={os.getpid()})")
+
+    last_seq = None
+    last_publish = 0.0
+    try:
+        while True:
+            bus.heartbeat("detection")
+            worker.set_idle(bool(bus.get_flag("idle")))
+            result = worker.get_latest_result()
+            # 结果更新时立即发布；统计信息至少每秒刷新一次
+            if result["seq"] != last_seq or time.time() - last_publish > 1.0:
+                stats = worker.get_stats()
+                stats["overwritten"] = source.stats["overwritten"]
+                bus.publish_result({"result": result, "stats": stats})
+                last_seq = result["seq"]
+                last_publish = time.time()
+            time.sleep(0.02)
+    finally:
+        worker.stop()
+        if hasattr(detector, "close"):
+            detector.close()
+
+
+def web_stage(bus_name, host, port, worker_id=0, message_queue=''):
+    """Web进程：Flask-SocketIO服务，帧与检测结果均来自总线"""
+    # 须在导入app之前设置，app导入时据此创建SocketIO
+    Config.WORKER_ID = str(worker_id)
+    Config.STREAM_PRODUCER = worker_id == 0
+    Config.SOCKETIO_MESSAGE_QUEUE = message_queue
+
+    import eventlet
+    from app import app, socketio, initialize_components
+
+    bus = FrameBus(bus_name)
+    stage = f"web-{worker_id}"
+    started = startup_heartbeat(bus, stage)
+    os.makedirs('static/captures', exist_ok=True)
+    initialize_components(frame_bus=bus)
+    started.set()
+
+    def heartbeat():
+        while True:
+            bus.heartbeat(stage)
+            eventlet.sleep(1.0)
+
+    eventlet.spawn(heartbeat)
+    role = "推流" if Config.STREAM_PRODUCER else "转发"
+    print(f"🌐 Web进程 {worker_id}（{role}）已启动 (pid={os.getpid()}): http://{host}:{port}")
+    socketio.run(app, host=host, port=port, debug=False, allow_unsafe_werkzeug=True)
+
+
+class Supervisor:
+    """监督进程：启动各阶段，退出或心跳超时时重启"""
+
+    def __init__(self, host, port, web_workers=1, message_queue=''):
+        self.ctx = multiprocessing.get_context("spawn")
+        self.bus = FrameBus(create=True)
+        self.targets = {
+            "capture": (capture_stage, (self.bus.name,)),
+            "detection": (detection_stage, (self.bus.name,)),
+        }
+        for worker_id in range(web_workers):
+            self.targets[f"web-{worker_id}"] = (
+                web_stage, (self.bus.name, host, port + worker_id, worker_id, message_queue)
+            )
+        self.processes = {}
+        self.started_at = {}
+        self.restarts = {stage: 0 for stage in self.targets}
+
+    def _start(self, stage):
+        if stage == "capture":
+            # 采集进程重启前摄像头视为关闭，重启后按capture_enabled自动重新打开
+            self.bus.set_flag("camera_running", 0)
+        target, args = self.targets[stage]
+        # 非守护进程：守护进程不能创建子进程，检测阶段需要启动YOLO工作进程池；退出时由run()统一终止
+        process = self.ctx.Process(target=target, args=args, name=f"pipeline-{stage}", daemon=False)
+        process.start()
+        self.processes[stage] = process
+        self.started_at[stage] = time.time()
+
+    def _check(self, stage):
+        process = self.processes.get(stage)
+        if process is None:
+            self._start(stage)
+            return
+
+        if process.is_alive():
+            # 各阶段在启动期间（加载模型等）由startup_heartbeat持续发送心跳；
+            # 进程刚创建、尚未发出第一次心跳时读到的是上一个实例的心跳，给予一个超时周期的宽限
+            age = self.bus.heartbeat_age(stage)
+            if time.time() - self.started_at[stage] < Config.STAGE_HEARTBEAT_TIMEOUT \
+                    or age is None or age < Config.STAGE_HEARTBEAT_TIMEOUT:
+                return
+            print(f"⚠️  {stage} 进程 {age:.1f} 秒无心跳，正在终止...")
+            process.terminate()
+            process.join(timeout=5)
+        else:
+            process.join()
+            print(f"⚠️  {stage} 进程已退出（exitcode={process.exitcode}）")
+
+        # 避免启动即崩溃的阶段被反复快速重启
+        if time.time() - self.started_at[stage] < Config.STAGE_RESTART_DELAY:
+            time.sleep(Config.STAGE_RESTART_DELAY)
+        self.restarts[stage] += 1
+        print(f"🔄 重启 {stage} 进程（第 {self.restarts[stage]} 次）")
+        self._start(stage)
+
+    def run(self):
+        print(f"🚀 多进程管线启动，帧总线: {self.bus.name} {self.bus.shape} × {self.bus.slots} 槽位")
+        try:
+            while True:
+                for stage in self.targets:
+                    self._check(stage)
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            print("\n👋 正在停止所有进程...")
+        finally:
+            for process in self.processes.values():
+                process.terminate()
+            for process in self.processes.values():
+                process.join(timeout=5)
+            self.bus.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='智能视觉分析助手（多进程管线）')
+    parser.add_argument('--host', default=Config.HOST, help='服务器地址')
+    parser.add_argument('--port', type=int, default=Config.PORT, help='端口号（worker i 监听 port+i）')
+    parser.add_argument('--web-workers', type=int, default=1, help=f'Web worker数量（最多{MAX_WEB_WORKERS}）')
+    parser.add_argument('--message-queue', default=Config.SOCKETIO_MESSAGE_QUEUE,
+                        help='Socket.IO消息队列，如 redis://127.0.0.1:6379/0（多个worker时必需）')
+    args = parser.parse_args()
+
+    if not 1 <= args.web_workers <= MAX_WEB_WORKERS:
+        parser.error(f"--web-workers 须在 1 到 {MAX_WEB_WORKERS} 之间")
+    if args.web_workers > 1 and not args.message_queue.startswith(('redis://', 'rediss://')):
+        parser.error("多个Web worker需要Redis消息队列（--message-queue redis://...）")
+
+    Supervisor(args.host, args.port, args.web_workers, args.message_queue).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,14 @@ class SmartVisionApp {
         this.frameCount = 0;
         this.lastFrameTime = Date.now();
         this.fpsInterval = null;
+        this.frameUrl = null;
+        // 叠加模式: server为服务器绘制检测框，client为接收原始画面并在canvas上绘制
+        // 默认值由服务器的STREAM_OVERLAY_MODE决定（页面渲染时设置开关状态）
+        const clientOverlay = document.getElementById('client-overlay');
+        this.overlayMode = clientOverlay && clientOverlay.checked ? 'client' : 'server';
+        this.showBoxes = true;
+        this.overlayData = null;
+        this.frameTimestamp = '';
         
         console.log('SmartVisionApp 初始化');
         this.init();
@@ -38,6 +46,10 @@ class SmartVisionApp {
             console.log('传输方式:', this.socket.io.engine.transport.name);
             this.isConnected = true;
             this.updateConnectionStatus(true);
+            // 页面可见时订阅视频流，服务器在无人订阅时暂停编码
+            if (!document.hidden) {
+                this.subscribeStream();
+            }
             this.showNotification('连接成功', 'success');
         });
         
@@ -55,8 +67,22 @@ class SmartVisionApp {
             this.showNotification('连接断开: ' + reason, 'warning');
         });
         
-        this.socket.on('video_frame', (data) => {
-            this.updateVideoFrame(data);
+        this.socket.on('video_frame', (data, ack) => {
+            this.updateVideoFrame(data, ack);
+        });
+        
+        // 往返时间探测：立即确认，服务器据此区分网络往返与传输耗时
+        this.socket.on('latency_probe', (data, ack) => {
+            if (ack) {
+                ack();
+            }
+        });
+        
+        // 浏览器叠加模式下，检测结果按检测频率单独推送
+        this.socket.on('detection_update', (data) => {
+            this.overlayData = data;
+            this.updateDetectionInfo(data);
+            this.drawOverlay();
         });
         
         this.socket.on('ai_response', (data) => {
@@ -65,6 +91,11 @@ class SmartVisionApp {
             this.handleAIResponse(data);
         });
         
+        // 流式回答：逐段追加到等待中的气泡，完整回答仍通过ai_response发送
+        this.socket.on('ai_response_delta', (data) => {
+            this.appendAIResponseDelta(data);
+        });
+        
         this.socket.on('scene_analysis', (data) => {
             this.handleSceneAnalysis(data);
         });
@@ -75,6 +106,35 @@ class SmartVisionApp {
     }
     
     bindEvents() {
+        document.addEventListener('visibilitychange', () => {
+            if (!this.isConnected) {
+                return;
+            }
+            if (document.hidden) {
+                this.socket.emit('unsubscribe_stream');
+            } else {
+                this.subscribeStream();
+            }
+        });
+        
+        document.getElementById('client-overlay').addEventListener('change', (e) => {
+            this.overlayMode = e.target.checked ? 'client' : 'server';
+            this.overlayData = null;
+            this.clearOverlay();
+            if (this.isConnected && !document.hidden) {
+                this.subscribeStream();
+            }
+        });
+        
+        document.getElementById('show-boxes').addEventListener('change', (e) => {
+            this.showBoxes = e.target.checked;
+            this.drawOverlay();
+        });
+        
+        window.addEventListener('resize', () => {
+            this.drawOverlay();
+        });
+        
         document.getElementById('start-camera').addEventListener('click', () => {
             this.startCamera();
         });
@@ -140,6 +200,14 @@ class SmartVisionApp {
                 document.getElementById('camera-status').className = 'h6 mb-0 text-secondary';
                 
                 const videoStream = document.getElementById('video-stream');
+                if (this.frameUrl) {
+                    URL.revokeObjectURL(this.frameUrl);
+                    this.frameUrl = null;
+                }
+                videoStream.onload = null;
+                videoStream.onerror = null;
+                this.overlayData = null;
+                this.clearOverlay();
                 videoStream.src = "data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNjQwIiBoZWlnaHQ9IjQ4MCIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48cmVjdCB3aWR0aD0iMTAwJSIgaGVpZ2h0PSIxMDAlIiBmaWxsPSIjZGRkIi8+PHRleHQgeD0iNTAlIiB5PSI1MCUiIGZvbnQtc2l6ZT0iMTgiIHRleHQtYW5jaG9yPSJtaWRkbGUiIGR5PSIuM2VtIj7op4blkpHmtYHlvIE8L3RleHQ+PC9zdmc+";
             } else {
                 this.showNotification(result.message, 'error');
@@ -149,19 +217,121 @@ class SmartVisionApp {
         }
     }
     
-    updateVideoFrame(data) {
-        console.log('📹 收到视频帧，大小:', data.frame ? data.frame.length : 0);
+    subscribeStream() {
+        this.socket.emit('subscribe_stream', { overlay: this.overlayMode });
+    }
+    
+    updateVideoFrame(data, ack) {
         const videoStream = document.getElementById('video-stream');
+        const clientOverlay = data.overlay === 'client';
+        // 帧解码显示后确认，服务器据此决定何时发送下一帧（慢客户端自动丢帧）
+        const done = () => {
+            if (clientOverlay) {
+                this.frameTimestamp = data.timestamp || '';
+                this.drawOverlay();
+            }
+            if (ack) {
+                ack();
+            }
+        };
         if (videoStream && data.frame) {
-            videoStream.src = data.frame;
-            console.log('✅ 视频帧已更新');
+            // 二进制JPEG -> Blob URL，浏览器异步解码；切换后立即释放旧URL
+            const blob = new Blob([data.frame], { type: 'image/jpeg' });
+            const previousUrl = this.frameUrl;
+            this.frameUrl = URL.createObjectURL(blob);
+            videoStream.onload = done;
+            videoStream.onerror = done;
+            videoStream.src = this.frameUrl;
+            if (previousUrl) {
+                URL.revokeObjectURL(previousUrl);
+            }
         } else {
             console.error('❌ 视频元素或帧数据不存在');
+            done();
+        }
+        if (data.detection_info) {
+            this.updateDetectionInfo(data.detection_info);
         }
-        this.updateDetectionInfo(data.detection_info);
         this.frameCount++;
     }
     
+    clearOverlay() {
+        const canvas = document.getElementById('overlay-canvas');
+        canvas.getContext('2d').clearRect(0, 0, canvas.width, canvas.height);
+    }
+    
+    overlayColor(classId) {
+        // 按类别ID分配固定色相，同类物体颜色一致
+        return `hsl(${(classId * 47) % 360}, 90%, 50%)`;
+    }
+    
+    drawOverlay() {
+        const canvas = document.getElementById('overlay-canvas');
+        const videoStream = document.getElementById('video-stream');
+        if (this.overlayMode !== 'client') {
+            this.clearOverlay();
+            return;
+        }
+        
+        // canvas覆盖在图像的实际显示区域上，按设备像素比设置分辨率
+        const width = videoStream.clientWidth;
+        const height = videoStream.clientHeight;
+        const ratio = window.devicePixelRatio || 1;
+        canvas.style.left = `${videoStream.offsetLeft}px`;
+        canvas.style.top = `${videoStream.offsetTop}px`;
+        canvas.style.width = `${width}px`;
+        canvas.style.height = `${height}px`;
+        if (canvas.width !== Math.round(width * ratio) || canvas.height !== Math.round(height * ratio)) {
+            canvas.width = Math.round(width * ratio);
+            canvas.height = Math.round(height * ratio);
+        }
+        
+        const ctx = canvas.getContext('2d');
+        ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+        ctx.clearRect(0, 0, width, height);
+        ctx.font = '12px sans-serif';
+        ctx.textBaseline = 'top';
+        
+        const data = this.overlayData;
+        if (this.showBoxes && data && data.frame_size && data.objects) {
+            // 检测框为原始帧坐标，缩放到显示尺寸
+            const scaleX = width / data.frame_size[0];
+            const scaleY = height / data.frame_size[1];
+            data.objects.forEach(obj => {
+                const [x1, y1, x2, y2] = obj.bbox;
+                const x = x1 * scaleX;
+                const y = y1 * scaleY;
+                const color = this.overlayColor(obj.class_id || 0);
+                let label = `${obj.class} ${obj.confidence.toFixed(2)}`;
+                if (obj.track_id !== undefined) {
+                    label = `#${obj.track_id} ${label}`;
+                }
+                
+                ctx.strokeStyle = color;
+                ctx.lineWidth = 2;
+                ctx.strokeRect(x, y, (x2 - x1) * scaleX, (y2 - y1) * scaleY);
+                
+                const labelWidth = ctx.measureText(label).width + 6;
+                const labelY = Math.max(y - 16, 0);
+                ctx.fillStyle = color;
+                ctx.fillRect(x, labelY, labelWidth, 16);
+                ctx.fillStyle = '#fff';
+                ctx.fillText(label, x + 3, labelY + 2);
+            });
+        }
+        
+        if (this.frameTimestamp) {
+            // 时间戳绘制在右下角（与服务器绘制的位置一致）
+            const textWidth = ctx.measureText(this.frameTimestamp).width;
+            const x = width - textWidth - 10;
+            const y = height - 24;
+            ctx.fillStyle = 'rgba(0, 0, 0, 0.7)';
+            ctx.fillRect(x - 4, y - 2, textWidth + 8, 18);
+            ctx.fillStyle = '#fff';
+            ctx.fillText(this.frameTimestamp, x, y);
+        }
+    }
+    
     updateDetectionInfo(detectionInfo) {
         document.getElementById('object-count').textContent = detectionInfo.object_count || 0;
         
@@ -259,6 +429,25 @@ class SmartVisionApp {
         console.log('=== handleAIResponse 结束 ===');
     }
     
+    appendAIResponseDelta(data) {
+        // 同一客户端的问题按顺序回答，增量总是属于最早的等待气泡
+        const pending = document.querySelector('.loading-message');
+        if (!pending || !data.delta) {
+            return;
+        }
+        
+        let textDiv = pending.querySelector('.stream-text');
+        if (!textDiv) {
+            // 收到第一段文本时把"正在思考中..."替换为回答文本
+            pending.innerHTML = '<div class="stream-text"></div>';
+            textDiv = pending.querySelector('.stream-text');
+        }
+        textDiv.textContent += data.delta;
+        
+        const container = document.getElementById('chat-messages');
+        container.scrollTop = container.scrollHeight;
+    }
+    
     addChatMessage(message, sender, isLoading = false) {
         console.log('addChatMessage:', message, sender, isLoading);
         
@@ -0,0 +1,165 @@
+"""
+检测标注渲染器 - 预计算类别调色板、缓存标签尺寸与预渲染的标签贴图
+"""
+from collections import OrderedDict
+import cv2
+import numpy as np
+from config import Config
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.5
+FONT_THICKNESS = 2
+TEXT_COLOR = (255, 255, 255)
+
+
+def build_palette(num_classes):
+    """
+    为每个类别生成固定颜色（使用独立的RandomState，不污染全局随机数状态）
+
+    Args:
+        num_classes: 类别数量
+
+    Returns:
+        list: 每个类别的BGR颜色元组
+    """
+    return [
+        tuple(int(c) for c in np.random.RandomState(class_id).randint(0, 255, 3))
+        for class_id in range(num_classes)
+    ]
+
+
+class AnnotationRenderer:
+    def __init__(self, class_names=None, cache_size=512):
+        """
+        初始化标注渲染器
+
+        Args:
+            class_names: 类别名称列表，默认使用COCO类别
+            cache_size: 标签尺寸和标签贴图缓存的最大条目数
+        """
+        self.class_names = class_names or Config.COCO_CLASSES
+        self.palette = build_palette(len(self.class_names))
+        self.cache_size = cache_size
+        self._metrics = OrderedDict()
+        self._sprites = OrderedDict()
+        # 所有贴图使用统一的行高，类别名与逐字符的数字后缀可以拼接在同一行
+        self.line_height = cv2.getTextSize("Ag0#", FONT, FONT_SCALE, FONT_THICKNESS)[0][1]
+        self.stats = {"sprite_hits": 0, "sprite_misses": 0}
+
+    def get_color(self, class_id):
+        """获取类别颜色"""
+        if 0 <= class_id < len(self.palette):
+            return self.palette[class_id]
+        return tuple(int(c) for c in np.random.RandomState(class_id).randint(0, 255, 3))
+
+    def _cache_get(self, cache, key):
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+    def _cache_put(self, cache, key, value):
+        cache[key] = value
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def text_size(self, label):
+        """
+        获取标签文字尺寸（带缓存）
+
+        Args:
+            label: 标签文字
+
+        Returns:
+            tuple: (宽, 高)
+        """
+        size = self._cache_get(self._metrics, label)
+        if size is None:
+            size = cv2.getTextSize(label, FONT, FONT_SCALE, FONT_THICKNESS)[0]
+            self._cache_put(self._metrics, label, size)
+        return size
+
+    def label_sprite(self, label, class_id):
+        """
+        获取预渲染的文字贴图（带背景色的文字块）
+
+        Args:
+            label: 文字（类别名或单个字符）
+            class_id: 类别ID（决定背景色）
+
+        Returns:
+            numpy.ndarray: 文字贴图
+        """
+        key = (label, class_id)
+        sprite = self._cache_get(self._sprites, key)
+        if sprite is not None:
+            self.stats["sprite_hits"] += 1
+            return sprite
+
+        self.stats["sprite_misses"] += 1
+        width, _ = self.text_size(label)
+        sprite = np.empty((self.line_height + 10, width, 3), dtype=np.uint8)
+        sprite[:] = self.get_color(class_id)
+        cv2.putText(sprite, label, (0, self.line_height + 5), FONT, FONT_SCALE, TEXT_COLOR, FONT_THICKNESS)
+        self._cache_put(self._sprites, key, sprite)
+        return sprite
+
+    @staticmethod
+    def _blit(image, sprite, x, y):
+        """将贴图复制到图像 (x, y) 处，超出边界部分裁剪"""
+        img_h, img_w = image.shape[:2]
+        h, w = sprite.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, img_w), min(y + h, img_h)
+        if x0 >= x1 or y0 >= y1:
+            return
+        image[y0:y1, x0:x1] = sprite[y0 - y:y1 - y, x0 - x:x1 - x]
+
+    @staticmethod
+    def format_suffix(obj):
+        """生成标签中类别名之后的部分（跟踪ID与置信度）"""
+        if "track_id" in obj:
+            return f" #{obj['track_id']}: {obj['confidence']:.2f}"
+        return f": {obj['confidence']:.2f}"
+
+    @classmethod
+    def format_label(cls, obj):
+        """生成对象的标签文字"""
+        return obj["class"] + cls.format_suffix(obj)
+
+    def label_sprites(self, obj, class_id):
+        """
+        获取组成标签的贴图序列：类别名一张贴图，后缀逐字符各一张
+
+        置信度和跟踪ID每次检测都在变，整条标签作为缓存键几乎不会命中；
+        拆开后缓存键只有类别名和十几个字符，绘制时不再调用putText
+        """
+        sprites = [self.label_sprite(obj["class"], class_id)]
+        sprites.extend(self.label_sprite(char, class_id) for char in self.format_suffix(obj))
+        return sprites
+
+    def draw(self, image, objects):
+        """
+        在图像上原地绘制检测框和标签
+
+        Args:
+            image: 可写的OpenCV图像
+            objects: 检测对象列表
+
+        Returns:
+            numpy.ndarray: 绘制后的图像（即传入的image）
+        """
+        for obj in objects:
+            x1, y1, x2, y2 = obj["bbox"]
+            class_id = obj.get("class_id", 0)
+
+            # 绘制边界框
+            cv2.rectangle(image, (x1, y1), (x2, y2), self.get_color(class_id), 2)
+
+            # 依次贴上预渲染的标签片段（位于框的左上角上方）
+            x, y = x1, y1 - self.line_height - 10
+            for sprite in self.label_sprites(obj, class_id):
+                self._blit(image, sprite, x, y)
+                x += sprite.shape[1]
+
+        return image
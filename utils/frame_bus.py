@@ -0,0 +1,386 @@
+"""
+共享内存帧总线 - 采集、检测、Web服务分别运行在独立进程中，通过共享内存环形槽位零拷贝共享帧
+
+布局：
+    控制块（{name}_ctl）：标志位、各阶段心跳、每个槽位的帧序号/时间戳、最新检测结果（JSON）
+    帧数据块（{name}_frames）：slots个固定形状的BGR帧槽位
+
+采集进程是唯一的写入方，按序号轮流写入槽位；读取方直接映射槽位（不拷贝），
+用完后通过槽位序号判断期间是否已被覆盖。
+"""
+import json
+import time
+from multiprocessing import shared_memory, resource_tracker
+import cv2
+import numpy as np
+from config import Config
+from utils.frame_pool import FramePool
+
+# 控制块中int64字段的下标
+_LATEST_SEQ = 0
+_HEIGHT = 1
+_WIDTH = 2
+_SLOTS = 3
+_RESULT_SEQ = 4
+_RESULT_LEN = 5
+FLAGS = {
+    "capture_enabled": 6,  # Web进程请求打开摄像头
+    "camera_running": 7,   # 采集进程报告摄像头已打开
+    "idle": 8,             # Web进程报告无人观看，检测进程降为心跳频率
+}
+_HEADER_FIELDS = 16
+
+# 各阶段心跳（float64）；Web服务最多MAX_WEB_WORKERS个worker
+MAX_WEB_WORKERS = 8
+STAGES = ("capture", "detection") + tuple(f"web-{i}" for i in range(MAX_WEB_WORKERS))
+
+RESULT_BYTES = 256 * 1024
+
+
+def _open_shm(name):
+    """附加到已存在的共享内存，不交给resource_tracker管理（由创建方负责释放）"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _create_shm(name, size):
+    """创建共享内存（清理上次异常退出残留的同名块）"""
+    try:
+        stale = shared_memory.SharedMemory(name=name)
+        stale.close()
+        stale.unlink()
+    except FileNotFoundError:
+        pass
+    return shared_memory.SharedMemory(name=name, create=True, size=size)
+
+
+class FrameBus:
+    def __init__(self, name=None, shape=None, slots=None, create=False):
+        """
+        创建或附加到帧总线
+
+        Args:
+            name: 总线名称，默认使用配置文件中的FRAME_BUS_NAME
+            shape: 帧形状 (高, 宽, 3)，仅创建时使用，默认为配置的采集分辨率
+            slots: 环形槽位数，仅创建时使用，默认使用配置文件中的FRAME_BUS_SLOTS
+            create: True表示创建（由监督进程调用），False表示附加到已有总线
+        """
+        self.name = name or Config.FRAME_BUS_NAME
+        self.owner = create
+
+        if create:
+            shape = tuple(shape or (Config.FRAME_HEIGHT, Config.FRAME_WIDTH, 3))
+            slots = slots or Config.FRAME_BUS_SLOTS
+            self.control = _create_shm(f"{self.name}_ctl", self._control_size(slots))
+            self.control.buf[:] = b"\x00" * self.control.size
+            self.frames_shm = _create_shm(f"{self.name}_frames", slots * int(np.prod(shape)))
+        else:
+            self.control = _open_shm(f"{self.name}_ctl")
+            header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=self.control.buf)
+            shape = (int(header[_HEIGHT]), int(header[_WIDTH]), 3)
+            slots = int(header[_SLOTS])
+            self.frames_shm = _open_shm(f"{self.name}_frames")
+
+        self.shape = shape
+        self.slots = slots
+        self._map(slots)
+        if create:
+            self.header[_HEIGHT], self.header[_WIDTH] = shape[0], shape[1]
+            self.header[_SLOTS] = slots
+        self.frames = np.ndarray((slots,) + shape, dtype=np.uint8, buffer=self.frames_shm.buf)
+
+    @staticmethod
+    def _control_size(slots):
+        return 8 * (_HEADER_FIELDS + len(STAGES) + 2 * slots) + RESULT_BYTES
+
+    def _map(self, slots):
+        """在控制块上建立各字段的numpy视图"""
+        buf = self.control.buf
+        offset = 0
+        self.header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += 8 * _HEADER_FIELDS
+        self.heartbeats = np.ndarray((len(STAGES),), dtype=np.float64, buffer=buf, offset=offset)
+        offset += 8 * len(STAGES)
+        self.slot_seq = np.ndarray((slots,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += 8 * slots
+        self.slot_time = np.ndarray((slots,), dtype=np.float64, buffer=buf, offset=offset)
+        offset += 8 * slots
+        self.result_buf = np.ndarray((RESULT_BYTES,), dtype=np.uint8, buffer=buf, offset=offset)
+
+    # ---- 帧 ----
+
+    def write(self, frame, timestamp=None):
+        """
+        写入一帧（仅采集进程调用）。分辨率与总线不一致时缩放到总线尺寸
+
+        Returns:
+            int: 帧序号
+        """
+        seq = int(self.header[_LATEST_SEQ]) + 1
+        slot = seq % self.slots
+        # 先把槽位标记为写入中，读取方据此判断该槽位的数据已失效
+        self.slot_seq[slot] = 0
+        target = self.frames[slot]
+        if frame.shape == self.shape:
+            np.copyto(target, frame)
+        else:
+            cv2.resize(frame, (self.shape[1], self.shape[0]), dst=target, interpolation=cv2.INTER_AREA)
+        self.slot_time[slot] = timestamp or time.time()
+        self.slot_seq[slot] = seq
+        self.header[_LATEST_SEQ] = seq
+        return seq
+
+    def latest_seq(self):
+        """最新帧序号"""
+        return int(self.header[_LATEST_SEQ])
+
+    def read(self, after_seq=0):
+        """
+        读取最新帧（零拷贝）
+
+        Args:
+            after_seq: 调用方已处理过的最后一个帧序号
+
+        Returns:
+            tuple: (seq, timestamp, 只读帧视图)，没有更新的帧时返回None
+        """
+        seq = self.latest_seq()
+        if seq <= after_seq:
+            return None
+        slot = seq % self.slots
+        timestamp = float(self.slot_time[slot])
+        if self.slot_seq[slot] != seq:
+            # 读取期间已被下一轮写入覆盖
+            return None
+        view = self.frames[slot].view()
+        view.flags.writeable = False
+        return seq, timestamp, view
+
+    def is_current(self, seq):
+        """序号为seq的帧是否仍未被覆盖（读取方用完零拷贝视图后检查）"""
+        return int(self.slot_seq[seq % self.slots]) == seq
+
+    # ---- 控制通道 ----
+
+    def set_flag(self, name, value):
+        self.header[FLAGS[name]] = int(value)
+
+    def get_flag(self, name):
+        return int(self.header[FLAGS[name]])
+
+    def heartbeat(self, stage):
+        """阶段进程报告存活"""
+        self.heartbeats[STAGES.index(stage)] = time.time()
+
+    def heartbeat_age(self, stage):
+        """距离该阶段上次心跳的秒数，从未报告时返回None"""
+        last = float(self.heartbeats[STAGES.index(stage)])
+        return time.time() - last if last else None
+
+    def publish_result(self, result):
+        """
+        发布最新检测结果（仅检测进程调用，使用序号锁保证读取方不会读到写了一半的数据）
+
+        Args:
+            result: 可JSON序列化的检测结果
+        """
+        data = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        if len(data) > RESULT_BYTES:
+            print(f"⚠️  检测结果过大（{len(data)}字节），已丢弃")
+            return
+        seq = int(self.header[_RESULT_SEQ])
+        self.header[_RESULT_SEQ] = seq + 1  # 奇数：写入中
+        self.result_buf[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+        self.header[_RESULT_LEN] = len(data)
+        self.header[_RESULT_SEQ] = seq + 2
+
+    def read_result(self, after_seq=0):
+        """
+        读取最新检测结果
+
+        Returns:
+            tuple: (结果序号, 结果dict)，没有更新的结果时返回None
+        """
+        for _ in range(10):
+            seq = int(self.header[_RESULT_SEQ])
+            if seq <= after_seq:
+                return None
+            if seq % 2:
+                time.sleep(0.001)
+                continue
+            data = bytes(self.result_buf[:int(self.header[_RESULT_LEN])])
+            if int(self.header[_RESULT_SEQ]) == seq:
+                return seq, json.loads(data.decode("utf-8"))
+        return None
+
+    def close(self):
+        """断开映射；创建方同时释放共享内存"""
+        self.frames = self.header = self.heartbeats = None
+        self.slot_seq = self.slot_time = self.result_buf = None
+        for shm in (self.control, self.frames_shm):
+            try:
+                shm.close()
+            except BufferError:
+                # 仍有零拷贝视图未释放，映射随进程退出解除
+                pass
+            if self.owner:
+                try:
+                    shm.unlink()
+                except FileNotFoundError:
+                    pass
+
+
+class BusFrameHandle:
+    """指向总线槽位的帧句柄（零拷贝），接口与FrameHandle一致；释放时统计期间是否被覆盖"""
+
+    jpeg = None
+
+    def __init__(self, source, seq, timestamp, frame):
+        self._source = source
+        self.seq = seq
+        self.timestamp = timestamp
+        self.frame = frame
+        self.buffer = frame
+
+    @property
+    def shape(self):
+        return self.frame.shape
+
+    def retain(self):
+        return self
+
+    def is_intact(self):
+        """槽位是否仍未被覆盖（零拷贝视图的像素仍是该帧）"""
+        return self._source.bus.is_current(self.seq)
+
+    def release(self):
+        if not self.is_intact():
+            self._source.stats["overwritten"] += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class BusVideoSource:
+    """从帧总线读取帧的视频源，接口与VideoProcessor一致，摄像头启停通过控制通道转交采集进程"""
+
+    def __init__(self, bus, zero_copy=False, sleep=time.sleep):
+        """
+        Args:
+            bus: FrameBus实例
+            zero_copy: True时直接返回槽位视图（适合短时使用，如检测）；
+                       False时拷贝到本地缓冲池（适合需要长期持有当前帧的Web进程）
+            sleep: 等待函数，Web进程传入eventlet.sleep以免阻塞hub
+        """
+        self.bus = bus
+        self.zero_copy = zero_copy
+        self.sleep = sleep
+        self.frame_pool = FramePool(size=4, name="bus")
+        self.frame_shape = bus.shape
+        self.is_running = False
+        self.stats = {"overwritten": 0}
+
+    def start_capture(self, timeout=10.0):
+        """请求采集进程打开摄像头，等待其确认"""
+        self.bus.set_flag("capture_enabled", 1)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.bus.get_flag("camera_running"):
+                self.is_running = True
+                return True
+            self.sleep(0.1)
+        print("❌ 采集进程未能在超时时间内打开摄像头")
+        return False
+
+    def stop_capture(self):
+        """请求采集进程关闭摄像头"""
+        self.bus.set_flag("capture_enabled", 0)
+        self.is_running = False
+
+    def is_camera_available(self):
+        return bool(self.bus.get_flag("camera_running"))
+
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        """
+        等待序号大于after_seq的新帧，返回格式与VideoProcessor.wait_for_frame一致
+
+        Returns:
+            dict: {"handle", "seq", "timestamp"}，超时时返回None；用完后必须调用handle.release()
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            packet = self.bus.read(after_seq)
+            if packet is not None:
+                break
+            if deadline is not None and time.time() >= deadline:
+                return None
+            self.sleep(0.005)
+
+        seq, timestamp, frame = packet
+        if self.zero_copy:
+            handle = BusFrameHandle(self, seq, timestamp, frame)
+        else:
+            handle = self.frame_pool.copy_from(frame)
+            if not self.bus.is_current(seq):
+                # 拷贝期间槽位被覆盖，放弃这一帧
+                handle.release()
+                self.stats["overwritten"] += 1
+                return None
+            handle.seq = seq
+            handle.timestamp = timestamp
+        return {"handle": handle, "seq": seq, "timestamp": timestamp}
+
+    def get_frame_seq(self):
+        return self.bus.latest_seq()
+
+    def get_camera_info(self):
+        return {
+            "available": self.is_camera_available(),
+            "width": self.bus.shape[1],
+            "height": self.bus.shape[0],
+            "fps": Config.FPS,
+            "camera_index": Config.CAMERA_INDEX,
+            "frame_bus": self.bus.name
+        }
+
+
+class BusDetectionClient:
+    """读取检测进程发布的结果，接口与DetectionWorker一致（Web进程使用）"""
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.result_seq = 0
+        self.latest = {
+            "result": {"objects": [], "object_count": 0, "seq": 0, "timestamp": None},
+            "stats": {}
+        }
+
+    def _refresh(self):
+        update = self.bus.read_result(self.result_seq)
+        if update is not None:
+            self.result_seq, self.latest = update
+
+    def set_idle(self, idle):
+        self.bus.set_flag("idle", idle)
+
+    def get_latest_result(self):
+        self._refresh()
+        return dict(self.latest["result"])
+
+    def get_tracked_objects(self, timestamp):
+        """跨进程不做外推，返回检测进程最近一次发布的（已跟踪的）对象"""
+        self._refresh()
+        return list(self.latest["result"]["objects"])
+
+    def get_stats(self):
+        self._refresh()
+        stats = dict(self.latest["stats"])
+        stats["heartbeat_age"] = self.bus.heartbeat_age("detection")
+        return stats
@@ -0,0 +1,253 @@
+"""
+帧缓冲池 - 预分配、可复用的帧内存与引用计数只读帧句柄
+"""
+import threading
+import cv2
+import numpy as np
+
+
+class FrameHandle:
+    """引用计数的帧句柄，在捕获、检测、标注、编码各阶段之间共享同一块内存"""
+
+    # 摄像头原始JPEG字节（仅直通模式的句柄持有）
+    jpeg = None
+
+    def __init__(self, pool, buffer):
+        self._pool = pool
+        self._refcount = 1
+        self.buffer = buffer
+        # 对外只暴露只读视图，防止下游阶段误改共享帧
+        self.frame = buffer.view()
+        self.frame.flags.writeable = False
+        self.seq = 0
+        self.timestamp = None
+
+    @property
+    def shape(self):
+        """帧形状"""
+        return self.buffer.shape
+
+    def retain(self):
+        """增加引用计数"""
+        with self._pool.lock:
+            if self._refcount <= 0:
+                raise RuntimeError("帧句柄已被释放，无法再次引用")
+            self._refcount += 1
+        return self
+
+    def release(self):
+        """减少引用计数，归零时将缓冲区归还到池中"""
+        with self._pool.lock:
+            if self._refcount <= 0:
+                return
+            self._refcount -= 1
+            if self._refcount > 0:
+                return
+        self._pool._recycle(self.buffer)
+
+    def is_intact(self):
+        """像素是否仍有效（池化缓冲区在释放前不会被复用，始终有效）"""
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class EncodedFrameHandle(FrameHandle):
+    """持有摄像头原始JPEG字节的帧句柄，首次访问像素（frame/buffer）时才解码"""
+
+    def __init__(self, pool, jpeg, shape=None):
+        self._pool = pool
+        self._refcount = 1
+        self.jpeg = jpeg
+        self._shape = tuple(shape) if shape else None
+        self._buffer = None
+        self._frame = None
+        self._decode_lock = threading.Lock()
+        self.seq = 0
+        self.timestamp = None
+
+    @property
+    def decoded(self):
+        """是否已经解码"""
+        return self._frame is not None
+
+    @property
+    def shape(self):
+        """帧形状（未解码时为摄像头报告的分辨率）"""
+        if self._buffer is not None:
+            return self._buffer.shape
+        return self._shape if self._shape else self.buffer.shape
+
+    @property
+    def buffer(self):
+        self._decode()
+        return self._buffer
+
+    @property
+    def frame(self):
+        self._decode()
+        return self._frame
+
+    def _decode(self):
+        """解码JPEG（多个消费者并发访问时只解码一次）"""
+        if self._frame is not None:
+            return
+        with self._decode_lock:
+            if self._frame is not None:
+                return
+            buffer = cv2.imdecode(np.frombuffer(self.jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if buffer is None:
+                raise ValueError("摄像头JPEG数据解码失败")
+            frame = buffer.view()
+            frame.flags.writeable = False
+            self._buffer = buffer
+            self._frame = frame
+        self._pool.record_decode()
+
+    def release(self):
+        """减少引用计数，归零时释放JPEG数据（已解码的缓冲区归还到池中）"""
+        with self._pool.lock:
+            if self._refcount <= 0:
+                return
+            self._refcount -= 1
+            if self._refcount > 0:
+                return
+        self._pool._recycle(self._buffer)
+
+
+class FramePool:
+    """预分配的帧缓冲池，按形状复用numpy缓冲区并统计内存分配与拷贝量"""
+
+    def __init__(self, size=4, name="frames"):
+        """
+        初始化帧缓冲池
+
+        Args:
+            size: 池中最多保留的空闲缓冲区数量
+            name: 池名称（用于统计输出）
+        """
+        self.size = size
+        self.name = name
+        self.lock = threading.Lock()
+        self._free = []
+        self.stats = {
+            "allocations": 0,
+            "allocated_bytes": 0,
+            "reuses": 0,
+            "copies": 0,
+            "copied_bytes": 0,
+            "in_use": 0,
+            "passthrough": 0,
+            "decodes": 0
+        }
+
+    def acquire(self, shape, dtype=np.uint8):
+        """
+        获取一个指定形状的可写缓冲区
+
+        Args:
+            shape: 帧形状，如 (720, 1280, 3)
+            dtype: 数据类型
+
+        Returns:
+            FrameHandle: 引用计数为1的帧句柄
+        """
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        with self.lock:
+            buffer = None
+            while self._free:
+                candidate = self._free.pop()
+                if candidate.shape == shape and candidate.dtype == dtype:
+                    buffer = candidate
+                    break
+                # 分辨率变化后旧缓冲区不再可用，直接丢弃
+            if buffer is None:
+                buffer = np.empty(shape, dtype=dtype)
+                self.stats["allocations"] += 1
+                self.stats["allocated_bytes"] += buffer.nbytes
+            else:
+                self.stats["reuses"] += 1
+            self.stats["in_use"] += 1
+        return FrameHandle(self, buffer)
+
+    def adopt(self, array):
+        """
+        将外部分配的数组纳入池管理（例如摄像头未能写入预分配缓冲区时）
+
+        Args:
+            array: numpy数组
+
+        Returns:
+            FrameHandle: 帧句柄
+        """
+        with self.lock:
+            self.stats["allocations"] += 1
+            self.stats["allocated_bytes"] += array.nbytes
+            self.stats["in_use"] += 1
+        return FrameHandle(self, array)
+
+    def wrap_jpeg(self, jpeg, shape=None):
+        """
+        将摄像头输出的JPEG字节包装为延迟解码的帧句柄（直通模式）
+
+        Args:
+            jpeg: JPEG字节
+            shape: 摄像头报告的帧形状
+
+        Returns:
+            EncodedFrameHandle: 帧句柄
+        """
+        with self.lock:
+            self.stats["passthrough"] += 1
+            self.stats["in_use"] += 1
+        return EncodedFrameHandle(self, jpeg, shape)
+
+    def record_decode(self):
+        """记录一次延迟解码"""
+        with self.lock:
+            self.stats["decodes"] += 1
+
+    def copy_from(self, frame):
+        """
+        从池中取出缓冲区并拷贝一份帧数据（用于需要原地绘制的输出帧）
+
+        Args:
+            frame: 源图像
+
+        Returns:
+            FrameHandle: 包含拷贝数据的帧句柄
+        """
+        handle = self.acquire(frame.shape, frame.dtype)
+        np.copyto(handle.buffer, frame)
+        self.record_copy(frame.nbytes)
+        return handle
+
+    def record_copy(self, nbytes):
+        """记录一次整帧拷贝"""
+        with self.lock:
+            self.stats["copies"] += 1
+            self.stats["copied_bytes"] += nbytes
+
+    def _recycle(self, buffer):
+        with self.lock:
+            self.stats["in_use"] -= 1
+            if buffer is not None and len(self._free) < self.size:
+                self._free.append(buffer)
+
+    def get_stats(self):
+        """
+        获取池统计信息
+
+        Returns:
+            dict: 分配次数、复用次数、拷贝字节数等
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats["free"] = len(self._free)
+        stats["name"] = self.name
+        return stats
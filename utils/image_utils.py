@@ -4,8 +4,7 @@
 import cv2
 import numpy as np
 import base64
-from PIL import Image
-import io
+from utils.jpeg_encoder import get_default_encoder
 
 def resize_image(image, max_width=800, max_height=600):
     """
@@ -62,13 +61,14 @@ def enhance_image(image, brightness=0, contrast=1.0, saturation=1.0):
     
     return image
 
-def add_timestamp(image, timestamp_str=None):
+def add_timestamp(image, timestamp_str=None, inplace=False):
     """
     在图像上添加时间戳
     
     Args:
         image: OpenCV图像
         timestamp_str: 时间戳字符串，如果为None则使用当前时间
+        inplace: 是否直接在传入的（可写）图像上绘制，避免整帧拷贝
         
     Returns:
         numpy.ndarray: 添加时间戳的图像
@@ -77,8 +77,8 @@ def add_timestamp(image, timestamp_str=None):
         from datetime import datetime
         timestamp_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
-    # 复制图像以避免修改原图
-    img_with_timestamp = image.copy()
+    # 默认复制图像以避免修改原图
+    img_with_timestamp = image if inplace else image.copy()
     
     # 设置字体和位置
     font = cv2.FONT_HERSHEY_SIMPLEX
@@ -103,6 +103,25 @@ def add_timestamp(image, timestamp_str=None):
     
     return img_with_timestamp
 
+def encode_jpeg(image, quality=90):
+    """
+    将OpenCV图像编码为JPEG字节（直接使用BGR数据，无需颜色转换）
+    
+    使用配置文件中JPEG_ENCODER指定的编码器（见utils/jpeg_encoder.py）。
+    
+    Args:
+        image: OpenCV图像
+        quality: JPEG质量 (1-100)
+        
+    Returns:
+        bytes: JPEG字节数据，失败时返回None
+    """
+    try:
+        return get_default_encoder().encode(image, quality)
+    except Exception as e:
+        print(f"JPEG编码失败: {e}")
+        return None
+
 def image_to_base64(image, format='JPEG', quality=90):
     """
     将OpenCV图像转换为base64字符串
@@ -116,24 +135,17 @@ def image_to_base64(image, format='JPEG', quality=90):
         str: base64编码的图像字符串
     """
     try:
-        # 转换BGR到RGB
-        if len(image.shape) == 3:
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        else:
-            image_rgb = image
-        
-        # 转换为PIL图像
-        pil_image = Image.fromarray(image_rgb)
-        
-        # 保存到字节流
-        buffer = io.BytesIO()
+        # 直接编码BGR数据，不再经过PIL和颜色转换
         if format.upper() == 'JPEG':
-            pil_image.save(buffer, format='JPEG', quality=quality)
+            data = encode_jpeg(image, quality=quality)
         else:
-            pil_image.save(buffer, format=format)
+            ok, buffer = cv2.imencode(f'.{format.lower()}', image)
+            data = buffer.tobytes() if ok else None
+        if data is None:
+            return None
         
         # 编码为base64
-        image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        image_base64 = base64.b64encode(data).decode('utf-8')
         return f"data:image/{format.lower()};base64,{image_base64}"
         
     except Exception as e:
@@ -0,0 +1,132 @@
+"""
+JPEG编码器 - 可插拔的编码实现（OpenCV / simplejpeg / PyTurboJPEG），直接编码BGR数据
+"""
+import cv2
+import numpy as np
+from config import Config
+
+SUBSAMPLING_CHOICES = ("444", "422", "420")
+
+
+class OpenCVEncoder:
+    """cv2.imencode，无需颜色转换；OpenCV 4.5.5+支持设置色度抽样"""
+
+    name = "opencv"
+
+    def __init__(self, subsampling=None, fast_dct=None):
+        self.params = []
+        subsampling = subsampling or Config.JPEG_SUBSAMPLING
+        sampling_flag = getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR", None)
+        if sampling_flag is not None:
+            factor = {
+                "444": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_444", None),
+                "422": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_422", None),
+                "420": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_420", None),
+            }.get(subsampling)
+            if factor is not None:
+                self.params += [int(sampling_flag), int(factor)]
+
+    def encode(self, image, quality):
+        ok, buffer = cv2.imencode(".jpg", image, [int(cv2.IMWRITE_JPEG_QUALITY), quality] + self.params)
+        return buffer.tobytes() if ok else None
+
+
+class SimpleJPEGEncoder:
+    """simplejpeg（基于libjpeg-turbo），支持BGR输入、色度抽样与快速DCT"""
+
+    name = "simplejpeg"
+
+    def __init__(self, subsampling=None, fast_dct=None):
+        import simplejpeg
+        self.simplejpeg = simplejpeg
+        self.subsampling = subsampling or Config.JPEG_SUBSAMPLING
+        self.fast_dct = Config.JPEG_FAST_DCT if fast_dct is None else fast_dct
+
+    def encode(self, image, quality):
+        # simplejpeg要求C连续的数组
+        image = np.ascontiguousarray(image)
+        return self.simplejpeg.encode_jpeg(
+            image,
+            quality=quality,
+            colorspace="BGR",
+            colorsubsampling=self.subsampling,
+            fastdct=self.fast_dct
+        )
+
+
+class TurboJPEGEncoder:
+    """PyTurboJPEG（libjpeg-turbo的ctypes绑定）"""
+
+    name = "turbojpeg"
+
+    def __init__(self, subsampling=None, fast_dct=None):
+        import turbojpeg
+        self.turbojpeg = turbojpeg
+        self.encoder = turbojpeg.TurboJPEG()
+        self.subsample = {
+            "444": turbojpeg.TJSAMP_444,
+            "422": turbojpeg.TJSAMP_422,
+            "420": turbojpeg.TJSAMP_420,
+        }[subsampling or Config.JPEG_SUBSAMPLING]
+        fast_dct = Config.JPEG_FAST_DCT if fast_dct is None else fast_dct
+        self.flags = turbojpeg.TJFLAG_FASTDCT if fast_dct else 0
+
+    def encode(self, image, quality):
+        return self.encoder.encode(
+            np.ascontiguousarray(image),
+            quality=quality,
+            pixel_format=self.turbojpeg.TJPF_BGR,
+            jpeg_subsample=self.subsample,
+            flags=self.flags
+        )
+
+
+ENCODERS = {
+    OpenCVEncoder.name: OpenCVEncoder,
+    SimpleJPEGEncoder.name: SimpleJPEGEncoder,
+    TurboJPEGEncoder.name: TurboJPEGEncoder,
+}
+
+# auto模式的优先顺序：libjpeg-turbo绑定优先，OpenCV兜底
+AUTO_ORDER = ("simplejpeg", "turbojpeg", "opencv")
+
+_default_encoder = None
+
+
+def create_encoder(name=None, subsampling=None, fast_dct=None):
+    """
+    创建JPEG编码器
+
+    Args:
+        name: 编码器名称（opencv / simplejpeg / turbojpeg / auto），默认使用配置文件中的JPEG_ENCODER
+        subsampling: 色度抽样（444 / 422 / 420）
+        fast_dct: 是否使用快速DCT（仅libjpeg-turbo编码器）
+
+    Returns:
+        编码器实例，具有name属性和encode(image, quality)方法
+    """
+    name = name or Config.JPEG_ENCODER
+    if subsampling is not None and subsampling not in SUBSAMPLING_CHOICES:
+        raise ValueError(f"不支持的色度抽样: {subsampling}")
+
+    if name != "auto":
+        if name not in ENCODERS:
+            raise ValueError(f"不支持的JPEG编码器: {name}，可选: auto, {', '.join(ENCODERS)}")
+        return ENCODERS[name](subsampling, fast_dct)
+
+    for candidate in AUTO_ORDER:
+        try:
+            return ENCODERS[candidate](subsampling, fast_dct)
+        except (ImportError, OSError, RuntimeError):
+            # 未安装对应的库或找不到libjpeg-turbo动态库
+            continue
+    return OpenCVEncoder(subsampling, fast_dct)
+
+
+def get_default_encoder():
+    """获取按配置创建的全局编码器（首次调用时创建）"""
+    global _default_encoder
+    if _default_encoder is None:
+        _default_encoder = create_encoder()
+        print(f"JPEG编码器: {_default_encoder.name}")
+    return _default_encoder
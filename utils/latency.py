@@ -0,0 +1,65 @@
+"""
+延迟统计 - 记录各处理函数/接口的耗时分布（p50/p99）以及eventlet hub的调度延迟
+"""
+import threading
+import time
+from collections import deque
+
+
+class LatencyRecorder:
+    def __init__(self, window=1000):
+        """
+        初始化延迟统计
+
+        Args:
+            window: 每个名称保留的最近样本数
+        """
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, name, duration_ms):
+        """记录一次耗时（毫秒）"""
+        with self.lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.window)
+            samples.append(duration_ms)
+
+    def timed(self, name):
+        """装饰器：记录被装饰函数的执行耗时"""
+        def decorator(func):
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, (time.perf_counter() - start) * 1000)
+            wrapper.__name__ = func.__name__
+            wrapper.__doc__ = func.__doc__
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _percentile(sorted_samples, percent):
+        index = min(int(len(sorted_samples) * percent / 100), len(sorted_samples) - 1)
+        return sorted_samples[index]
+
+    def get_stats(self):
+        """
+        获取各名称的耗时分布
+
+        Returns:
+            dict: name -> {count, p50_ms, p99_ms, max_ms}
+        """
+        with self.lock:
+            snapshot = {name: sorted(samples) for name, samples in self.samples.items()}
+        return {
+            name: {
+                "count": len(samples),
+                "p50_ms": round(self._percentile(samples, 50), 2),
+                "p99_ms": round(self._percentile(samples, 99), 2),
+                "max_ms": round(samples[-1], 2)
+            }
+            for name, samples in snapshot.items() if samples
+        }
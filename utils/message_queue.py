@@ -0,0 +1,119 @@
+"""
+消息队列 - 多个Web worker之间转发Socket.IO消息以及内部控制消息
+
+支持两种后端（由 SOCKETIO_MESSAGE_QUEUE 的URL前缀决定）：
+    redis://、rediss://  Redis（或兼容Redis协议的服务），用于多进程/多机部署
+    local://             进程内实现，用于单进程下测试消息队列路径
+"""
+import pickle
+import eventlet
+from eventlet.queue import Queue
+import socketio
+from config import Config
+
+REDIS_SCHEMES = ("redis://", "rediss://")
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """进程内的Socket.IO消息队列，同一进程中的多个Socket.IO服务器互相转发消息"""
+
+    name = "local"
+    _subscribers = []
+
+    def __init__(self, channel="socketio", write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.queue = Queue()
+        if not write_only:
+            LocalPubSubManager._subscribers.append(self.queue)
+
+    def _publish(self, data):
+        for queue in list(LocalPubSubManager._subscribers):
+            queue.put(data)
+
+    def _listen(self):
+        while True:
+            yield self.queue.get()
+
+
+def socketio_queue_options(url=None):
+    """
+    生成SocketIO(...)的消息队列参数
+
+    Args:
+        url: 消息队列URL，默认使用配置文件中的SOCKETIO_MESSAGE_QUEUE，为空表示单worker
+
+    Returns:
+        dict: 传给SocketIO构造函数的关键字参数
+    """
+    url = Config.SOCKETIO_MESSAGE_QUEUE if url is None else url
+    if not url:
+        return {}
+    if url.startswith("local://"):
+        return {"client_manager": LocalPubSubManager(channel=Config.SOCKETIO_CHANNEL)}
+    if url.startswith(REDIS_SCHEMES):
+        return {"message_queue": url, "channel": Config.SOCKETIO_CHANNEL}
+    raise ValueError(f"不支持的消息队列: {url}，可选: redis://、rediss://、local://")
+
+
+class LocalControlChannel:
+    """进程内控制通道：发布时同步调用本进程的订阅者"""
+
+    _handlers = {}
+
+    def publish(self, channel, message):
+        for handler in list(LocalControlChannel._handlers.get(channel, [])):
+            handler(message)
+
+    def subscribe(self, channel, handler):
+        LocalControlChannel._handlers.setdefault(channel, []).append(handler)
+
+
+class RedisControlChannel:
+    """
+    基于Redis发布/订阅的控制通道
+
+    消息以pickle序列化（与python-socketio的消息队列相同），可以直接携带编码好的JPEG字节
+    """
+
+    def __init__(self, url):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self.redis.publish(channel, pickle.dumps(message))
+
+    def subscribe(self, channel, handler):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+
+        def listen():
+            # socket已被patch为协作式，在greenthread中等待消息不会阻塞hub
+            while True:
+                try:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "message":
+                        handler(pickle.loads(message["data"]))
+                except Exception as e:
+                    print(f"❌ 控制消息处理失败: {e}")
+                    eventlet.sleep(1)
+                eventlet.sleep(0)
+
+        eventlet.spawn(listen)
+
+
+def create_control_channel(url=None):
+    """
+    创建worker之间的控制通道（与Socket.IO共用同一个消息队列服务）
+
+    Returns:
+        控制通道实例，具有publish(channel, message)和subscribe(channel, handler)方法；
+        未配置消息队列时返回None
+    """
+    url = Config.SOCKETIO_MESSAGE_QUEUE if url is None else url
+    if not url:
+        return None
+    if url.startswith("local://"):
+        return LocalControlChannel()
+    if url.startswith(REDIS_SCHEMES):
+        return RedisControlChannel(url)
+    raise ValueError(f"不支持的消息队列: {url}，可选: redis://、rediss://、local://")
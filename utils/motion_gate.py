@@ -0,0 +1,83 @@
+"""
+运动门控 - 通过降采样帧差判断画面是否变化，静态场景下跳过YOLO推理
+"""
+import time
+import cv2
+import numpy as np
+from config import Config
+
+
+class MotionGate:
+    def __init__(self, threshold=None, pixel_delta=None, max_staleness=None, size=None):
+        """
+        初始化运动门控
+
+        Args:
+            threshold: 变化像素比例阈值，超过则认为画面有变化
+            pixel_delta: 单个像素灰度差超过该值才计为变化
+            max_staleness: 最长复用时间（秒），超过后强制重新检测
+            size: 降采样后的 (宽, 高)
+        """
+        self.threshold = threshold if threshold is not None else Config.MOTION_THRESHOLD
+        self.pixel_delta = pixel_delta if pixel_delta is not None else Config.MOTION_PIXEL_DELTA
+        self.max_staleness = max_staleness if max_staleness is not None else Config.MOTION_MAX_STALENESS
+        self.size = size or Config.MOTION_SAMPLE_SIZE
+        self.reference = None
+        self.last_refresh = 0.0
+        self.stats = {"checks": 0, "skipped": 0, "forced_refreshes": 0}
+
+    def _downsample(self, frame):
+        """缩小并转为灰度，去除噪声影响"""
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def should_detect(self, frame):
+        """
+        判断当前帧是否需要重新检测
+
+        与上次检测时的参考帧比较（而不是上一帧），缓慢变化也会被累积发现。
+
+        Args:
+            frame: OpenCV图像帧
+
+        Returns:
+            bool: True表示需要检测，False表示可复用上次结果
+        """
+        self.stats["checks"] += 1
+        small = self._downsample(frame)
+        now = time.time()
+
+        if self.reference is None or self.reference.shape != small.shape:
+            self._refresh(small, now)
+            return True
+
+        if now - self.last_refresh >= self.max_staleness:
+            self.stats["forced_refreshes"] += 1
+            self._refresh(small, now)
+            return True
+
+        diff = cv2.absdiff(small, self.reference)
+        changed_ratio = np.count_nonzero(diff > self.pixel_delta) / diff.size
+        if changed_ratio >= self.threshold:
+            self._refresh(small, now)
+            return True
+
+        self.stats["skipped"] += 1
+        return False
+
+    def _refresh(self, small, now):
+        self.reference = small
+        self.last_refresh = now
+
+    def get_stats(self):
+        """
+        获取门控统计信息
+
+        Returns:
+            dict: 检查次数、跳过次数、跳过比例等
+        """
+        stats = dict(self.stats)
+        stats["skip_ratio"] = stats["skipped"] / stats["checks"] if stats["checks"] else 0.0
+        return stats
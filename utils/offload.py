@@ -0,0 +1,67 @@
+"""
+阻塞任务卸载 - 将OpenCV/编码等CPU密集操作放到原生线程池执行，避免阻塞eventlet hub
+"""
+import time
+import eventlet
+from eventlet import tpool
+from eventlet.semaphore import Semaphore
+from config import Config
+
+
+class Offloader:
+    def __init__(self, max_in_flight=None, enabled=None):
+        """
+        初始化卸载器
+
+        Args:
+            max_in_flight: 同时在原生线程中执行的最大任务数
+            enabled: 是否启用卸载（关闭时直接在hub上执行，便于对比延迟）
+        """
+        self.max_in_flight = max_in_flight or Config.OFFLOAD_MAX_IN_FLIGHT
+        self.enabled = Config.OFFLOAD_ENABLED if enabled is None else enabled
+        self.semaphore = Semaphore(self.max_in_flight)
+        self.stats = {"tasks": 0, "in_flight": 0, "waited": 0}
+
+    def run(self, func, *args, **kwargs):
+        """
+        在原生线程池中执行函数并等待结果（调用方greenthread让出hub）
+
+        超过max_in_flight时调用方在信号量上等待，不会无限堆积任务。
+
+        Returns:
+            func的返回值
+        """
+        if not self.enabled:
+            return func(*args, **kwargs)
+
+        if self.semaphore.locked():
+            self.stats["waited"] += 1
+        with self.semaphore:
+            self.stats["tasks"] += 1
+            self.stats["in_flight"] += 1
+            try:
+                return tpool.execute(func, *args, **kwargs)
+            finally:
+                self.stats["in_flight"] -= 1
+
+    def get_stats(self):
+        """获取卸载统计"""
+        stats = dict(self.stats)
+        stats["enabled"] = self.enabled
+        stats["max_in_flight"] = self.max_in_flight
+        return stats
+
+
+def hub_lag_monitor(recorder, interval=0.05):
+    """
+    hub调度延迟探针：greenthread定时睡眠，实际唤醒时间超出的部分即hub被阻塞的时间
+
+    Args:
+        recorder: LatencyRecorder实例
+        interval: 探测间隔（秒）
+    """
+    while True:
+        start = time.perf_counter()
+        eventlet.sleep(interval)
+        lag_ms = (time.perf_counter() - start - interval) * 1000
+        recorder.record("hub_lag", max(lag_ms, 0.0))
@@ -0,0 +1,148 @@
+"""
+VLM响应缓存 - 以帧的感知哈希、规范化问题和检测摘要为键的LRU+TTL缓存
+
+画面基本不变时重复提问（或反复点击场景分析）直接返回缓存的回答，省去数秒的付费调用。
+感知哈希对噪声、轻微亮度变化不敏感，汉明距离不超过阈值的两帧视为同一画面。
+"""
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+import cv2
+import numpy as np
+from config import Config
+
+
+def perceptual_hash(image):
+    """
+    计算图像的感知哈希（pHash）：32x32灰度图做DCT，取左上8x8低频系数与中位数比较
+
+    Args:
+        image: OpenCV图像（BGR或灰度）
+
+    Returns:
+        int: 64位哈希
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8]
+    bits = (low > np.median(low)).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a, b):
+    """两个哈希之间不同的位数"""
+    return bin(a ^ b).count("1")
+
+
+def normalize_question(question):
+    """规范化问题：去掉首尾空白与结尾标点，合并空白，英文转小写"""
+    question = re.sub(r"\s+", " ", question or "").strip().lower()
+    return question.rstrip("?？。.!！~ ")
+
+
+def detection_key(detection_info):
+    """检测摘要：按类别统计的数量，与物体顺序和置信度无关"""
+    if not detection_info or not detection_info.get("objects"):
+        return ""
+    counts = Counter(obj["class"] for obj in detection_info["objects"])
+    return ",".join(f"{name}:{count}" for name, count in sorted(counts.items()))
+
+
+def same_request(a, b, max_distance=None):
+    """
+    两个请求键是否视为同一请求：文本部分相同且画面哈希距离不超过阈值
+
+    Args:
+        a, b: (文本键, 感知哈希)
+        max_distance: 最大汉明距离，默认使用配置文件中的VLM_CACHE_MAX_DISTANCE
+    """
+    max_distance = Config.VLM_CACHE_MAX_DISTANCE if max_distance is None else max_distance
+    return a[0] == b[0] and hamming_distance(a[1], b[1]) <= max_distance
+
+
+class ResponseCache:
+    def __init__(self, max_size=None, ttl=None, max_distance=None):
+        """
+        初始化响应缓存
+
+        Args:
+            max_size: 最多缓存的回答数，超出时淘汰最久未使用的
+            ttl: 缓存有效期（秒）
+            max_distance: 视为同一画面的最大哈希汉明距离（0-64）
+        """
+        self.max_size = max_size or Config.VLM_CACHE_SIZE
+        self.ttl = Config.VLM_CACHE_TTL if ttl is None else ttl
+        self.max_distance = Config.VLM_CACHE_MAX_DISTANCE if max_distance is None else max_distance
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "saved_latency_ms": 0.0}
+
+    def make_key(self, image, question, detection_info=None):
+        """
+        生成缓存键
+
+        Returns:
+            tuple: (文本键, 感知哈希)
+        """
+        return (normalize_question(question), detection_key(detection_info)), perceptual_hash(image)
+
+    def get(self, key):
+        """
+        查找缓存：文本键相同、哈希距离不超过阈值且未过期的最近条目
+
+        Returns:
+            缓存的回答，未命中时返回None
+        """
+        text_key, image_hash = key
+        now = time.time()
+        with self.lock:
+            best = None
+            for entry_key, entry in list(self.entries.items()):
+                if now - entry["created"] > self.ttl:
+                    del self.entries[entry_key]
+                    continue
+                if entry_key[0] != text_key:
+                    continue
+                distance = hamming_distance(entry_key[1], image_hash)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, entry_key, entry)
+
+            if best is None:
+                self.stats["misses"] += 1
+                return None
+            _, entry_key, entry = best
+            self.entries.move_to_end(entry_key)
+            self.stats["hits"] += 1
+            self.stats["saved_latency_ms"] += entry["duration_ms"]
+            return entry["value"]
+
+    def put(self, key, value, duration_ms):
+        """
+        写入缓存
+
+        Args:
+            key: make_key生成的键
+            value: 回答
+            duration_ms: 生成该回答的调用耗时（命中时计入节省的延迟）
+        """
+        with self.lock:
+            self.entries[key] = {"value": value, "created": time.time(), "duration_ms": duration_ms}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get_stats(self):
+        """获取缓存统计"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self.entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["saved_calls"] = stats["hits"]
+        stats["saved_latency_ms"] = round(stats["saved_latency_ms"], 1)
+        stats["max_size"] = self.max_size
+        stats["ttl"] = self.ttl
+        stats["max_distance"] = self.max_distance
+        return stats
@@ -0,0 +1,321 @@
+"""
+视频帧广播器 - 每帧只编码一次，按客户端确认（ack）节奏分发，慢客户端只保留最新一帧
+"""
+import threading
+import time
+from collections import deque
+import eventlet
+from eventlet.event import Event
+from config import Config
+
+
+class StreamBroadcaster:
+    def __init__(self, send_func, ack_timeout=5.0, rendition_count=None, probe_func=None):
+        """
+        初始化广播器
+
+        Args:
+            send_func: 发送函数 send_func(sid, payload, callback)，callback在客户端确认后调用
+            ack_timeout: 等待确认的最长时间（秒），超时视为丢失，允许继续发送
+            rendition_count: 码率阶梯档位数，默认使用配置文件中的STREAM_RENDITIONS
+            probe_func: 往返时间探测函数 probe_func(sid, callback)，发送一条极小的消息，客户端收到后立即确认；
+                        未提供时确认延迟全部视为传输耗时
+        """
+        self.send_func = send_func
+        self.probe_func = probe_func
+        self.ack_timeout = ack_timeout
+        self.rendition_count = rendition_count or len(Config.STREAM_RENDITIONS)
+        self.lock = threading.Lock()
+        self.clients = {}
+
+    def add_client(self, sid, overlay="server"):
+        """
+        注册客户端（重复注册时只更新叠加模式）
+
+        Args:
+            sid: 客户端会话ID
+            overlay: 叠加模式，server为服务器绘制检测框，client为发送原始画面由浏览器绘制
+        """
+        with self.lock:
+            client = self.clients.get(sid)
+            if client is not None:
+                client["overlay"] = overlay
+                return
+            self.clients[sid] = {
+                "overlay": overlay,
+                "in_flight": None,   # 已发送未确认的发送时间
+                "mailbox": None,     # 单槽信箱：只保留最新一帧
+                "delivered": 0,
+                "dropped": 0,
+                "delivered_times": deque(maxlen=120),
+                "last_ack_latency_ms": 0.0,
+                "connected_at": time.time(),
+                # 自适应档位：0为最高清晰度
+                "rendition": 0,
+                "latency_ewma_ms": 0.0,
+                # 确认延迟 = 往返时间 + 传输/解码耗时；只有后者随档位变化
+                "rtt_ms": None,
+                "transfer_ewma_ms": 0.0,
+                "probe_sent": None,
+                "last_probe": 0.0,
+                "window_sent": 0,
+                "window_dropped": 0,
+                "last_adapt": time.time()
+            }
+
+    def remove_client(self, sid):
+        """移除客户端"""
+        with self.lock:
+            self.clients.pop(sid, None)
+
+    def client_count(self):
+        """当前客户端数量"""
+        with self.lock:
+            return len(self.clients)
+
+    def active_variants(self):
+        """
+        当前有客户端使用的（叠加模式, 档位）组合（只需编码这些组合）
+
+        Returns:
+            set: (overlay, 档位索引)
+        """
+        with self.lock:
+            return {(client["overlay"], client["rendition"]) for client in self.clients.values()}
+
+    def overlay_client_count(self):
+        """由浏览器绘制检测框的客户端数量"""
+        with self.lock:
+            return sum(1 for client in self.clients.values() if client["overlay"] == "client")
+
+    def publish(self, payloads):
+        """
+        发布一帧（同一叠加模式、同一档位的客户端共享同一个payload对象）
+
+        空闲的客户端立即发送；仍在等待上一帧确认的客户端放入信箱，
+        信箱中未被消费的旧帧直接丢弃。
+
+        Args:
+            payloads: (overlay, 档位索引) -> 已编码好的帧数据
+        """
+        now = time.time()
+        to_send = []
+        with self.lock:
+            for sid, client in self.clients.items():
+                payload = payloads.get((client["overlay"], client["rendition"]))
+                if payload is None:
+                    continue
+                client["window_sent"] += 1
+                if client["in_flight"] is not None and now - client["in_flight"] < self.ack_timeout:
+                    if client["mailbox"] is not None:
+                        client["dropped"] += 1
+                        client["window_dropped"] += 1
+                    client["mailbox"] = payload
+                else:
+                    client["in_flight"] = now
+                    to_send.append((sid, payload, self._probe_due(client, now)))
+
+        for sid, payload, probe in to_send:
+            if probe:
+                self._probe(sid)
+            self._send(sid, payload)
+
+    def _probe_due(self, client, now):
+        """
+        是否需要在发送下一帧之前探测往返时间（调用方持有锁）
+
+        探测只在没有帧在途时发出：探测消息排在下一帧之前，不会被大帧阻塞，测到的是纯往返时间
+        """
+        if self.probe_func is None or client["probe_sent"] is not None:
+            return False
+        if client["rtt_ms"] is not None and now - client["last_probe"] < Config.ADAPT_PROBE_INTERVAL:
+            return False
+        client["probe_sent"] = now
+        client["last_probe"] = now
+        return True
+
+    def _probe(self, sid):
+        try:
+            self.probe_func(sid, lambda *args: self.probe_ack(sid))
+        except Exception as e:
+            print(f"❌ 向客户端 {sid} 发送探测失败: {e}")
+            with self.lock:
+                client = self.clients.get(sid)
+                if client is not None:
+                    client["probe_sent"] = None
+
+    def probe_ack(self, sid):
+        """客户端确认探测消息：更新往返时间"""
+        now = time.time()
+        with self.lock:
+            client = self.clients.get(sid)
+            if client is None or client["probe_sent"] is None:
+                return
+            rtt_ms = (now - client["probe_sent"]) * 1000
+            client["probe_sent"] = None
+            client["rtt_ms"] = rtt_ms if client["rtt_ms"] is None else 0.5 * client["rtt_ms"] + 0.5 * rtt_ms
+
+    def _send(self, sid, payload):
+        try:
+            self.send_func(sid, payload, lambda *args: self.ack(sid))
+        except Exception as e:
+            print(f"❌ 向客户端 {sid} 发送视频帧失败: {e}")
+            with self.lock:
+                client = self.clients.get(sid)
+                if client is not None:
+                    client["in_flight"] = None
+
+    def ack(self, sid):
+        """
+        客户端确认已消费一帧：记录统计，若信箱中有更新的帧则立即发送
+
+        Args:
+            sid: 客户端会话ID
+        """
+        now = time.time()
+        with self.lock:
+            client = self.clients.get(sid)
+            if client is None:
+                return
+            if client["in_flight"] is not None:
+                latency_ms = (now - client["in_flight"]) * 1000
+                client["last_ack_latency_ms"] = latency_ms
+                client["latency_ewma_ms"] = 0.8 * client["latency_ewma_ms"] + 0.2 * latency_ms
+                transfer_ms = max(latency_ms - (client["rtt_ms"] or 0.0), 0.0)
+                client["transfer_ewma_ms"] = 0.8 * client["transfer_ewma_ms"] + 0.2 * transfer_ms
+            self._adapt(client, now)
+            client["delivered"] += 1
+            client["delivered_times"].append(now)
+            payload = client["mailbox"]
+            client["mailbox"] = None
+            client["in_flight"] = now if payload is not None else None
+            probe = self._probe_due(client, now) if payload is not None else False
+
+        if probe:
+            self._probe(sid)
+        if payload is not None:
+            self._send(sid, payload)
+
+    def _adapt(self, client, now):
+        """
+        根据传输耗时和超出往返时间所能解释的丢帧比例调整客户端档位（调用方持有锁）
+
+        每个客户端同一时刻只有一帧在途，往返时间本身就把送达帧率限制在 1000/RTT 以内，
+        这部分丢帧与码率无关，降档也无法减少；只有传输耗时（确认延迟扣除往返时间）
+        和超出这部分的丢帧才说明带宽或客户端解码跟不上
+        """
+        elapsed = now - client["last_adapt"]
+        if elapsed < Config.ADAPT_COOLDOWN:
+            return
+        if self.probe_func is not None and client["rtt_ms"] is None:
+            # 尚未测得往返时间，暂不调整
+            return
+
+        sent = client["window_sent"]
+        drop_ratio = client["window_dropped"] / sent if sent else 0.0
+        offered_fps = sent / elapsed
+        rtt = max(client["rtt_ms"] or 0.0, 1.0)
+        explained_ratio = max(0.0, 1.0 - 1000.0 / (rtt * offered_fps)) if offered_fps > 0 else 0.0
+        excess_drop = drop_ratio - explained_ratio
+        transfer = client["transfer_ewma_ms"]
+        rendition = client["rendition"]
+
+        if (transfer > Config.ADAPT_DOWN_LATENCY_MS or excess_drop > Config.ADAPT_DROP_RATIO) \
+                and rendition < self.rendition_count - 1:
+            rendition += 1
+        elif transfer < Config.ADAPT_UP_LATENCY_MS and excess_drop < Config.ADAPT_DROP_RATIO / 2 and rendition > 0:
+            rendition -= 1
+
+        # 每个冷却窗口结束时重新统计
+        client["window_sent"] = 0
+        client["window_dropped"] = 0
+        client["last_adapt"] = now
+        client["rendition"] = rendition
+
+    def get_stats(self):
+        """
+        获取每个客户端的分发统计
+
+        Returns:
+            dict: sid -> {delivered_fps, queue_depth, delivered, dropped, ack_latency_ms, rtt_ms, transfer_ms,
+                          rendition, overlay}
+        """
+        now = time.time()
+        stats = {}
+        with self.lock:
+            for sid, client in self.clients.items():
+                recent = [t for t in client["delivered_times"] if now - t <= 5.0]
+                stats[sid] = {
+                    "delivered_fps": round(len(recent) / 5.0, 1),
+                    "queue_depth": int(client["in_flight"] is not None) + int(client["mailbox"] is not None),
+                    "delivered": client["delivered"],
+                    "dropped": client["dropped"],
+                    "ack_latency_ms": round(client["last_ack_latency_ms"], 1),
+                    "rtt_ms": round(client["rtt_ms"], 1) if client["rtt_ms"] is not None else None,
+                    "transfer_ms": round(client["transfer_ewma_ms"], 1),
+                    "rendition": Config.STREAM_RENDITIONS[client["rendition"]]["name"],
+                    "overlay": client["overlay"]
+                }
+        return stats
+
+
+class LatestFrameChannel:
+    """最新编码帧通道：所有HTTP（MJPEG）连接共享同一份编码结果，各连接按自身节奏取最新帧"""
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.jpeg = None
+        self.subscribers = 0
+        # 每帧一个事件：发布时唤醒所有等待中的连接，然后换成新事件
+        self.event = Event()
+
+    def publish(self, seq, jpeg):
+        """发布新编码的帧并唤醒等待的连接（须在hub的greenthread中调用）"""
+        with self.lock:
+            self.seq = seq
+            self.jpeg = jpeg
+            event, self.event = self.event, Event()
+        event.send(seq)
+
+    def wait_for_frame(self, last_seq, timeout=1.0):
+        """
+        等待比last_seq更新的帧（在greenthread中调用，无新帧时挂起而不是轮询）
+
+        Args:
+            last_seq: 调用方已发送的帧序号
+            timeout: 最长等待秒数
+
+        Returns:
+            tuple: (seq, jpeg字节)，超时时返回当前最新帧（可能与last_seq相同）
+        """
+        with self.lock:
+            if self.jpeg is not None and self.seq != last_seq:
+                return self.seq, self.jpeg
+            event = self.event
+        with eventlet.Timeout(timeout, False):
+            event.wait()
+        return self.get_latest()
+
+    def get_latest(self):
+        """
+        获取最新帧
+
+        Returns:
+            tuple: (seq, jpeg字节)，尚无帧时jpeg为None
+        """
+        with self.lock:
+            return self.seq, self.jpeg
+
+    def subscribe(self):
+        with self.lock:
+            self.subscribers += 1
+
+    def unsubscribe(self):
+        with self.lock:
+            self.subscribers -= 1
+
+    def subscriber_count(self):
+        with self.lock:
+            return self.subscribers
@@ -7,6 +7,7 @@ import queue
 import time
 import numpy as np
 from config import Config
+from utils.frame_pool import FramePool
 
 class VideoProcessor:
     def __init__(self, camera_index=None):
@@ -20,8 +21,17 @@ class VideoProcessor:
         self.cap = None
         self.is_running = False
         self.frame_queue = queue.Queue(maxsize=5)
-        self.latest_frame = None
+        # 捕获直接写入池中预分配的缓冲区，最新帧以引用计数句柄发布，避免逐级拷贝
+        self.frame_pool = FramePool(size=self.frame_queue.maxsize + 4, name="capture")
+        self.frame_shape = None
+        self.latest_handle = None
         self.frame_lock = threading.Lock()
+        # 帧序号与捕获时间，序号单调递增（跨启停不重置），供消费者判断是否有新帧
+        self.frame_seq = 0
+        self.frame_timestamp = None
+        self.frame_condition = threading.Condition(self.frame_lock)
+        # MJPEG直通：保留摄像头输出的JPEG字节，需要像素时才解码
+        self.passthrough = False
         
     def start_capture(self):
         """开始视频捕获"""
@@ -40,12 +50,17 @@ class VideoProcessor:
             self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # 减少缓冲延迟
             self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))  # 使用MJPEG编码
             
+            # 直通模式：关闭OpenCV的解码，read()直接返回摄像头的JPEG字节
+            # （并非所有后端都支持，捕获第一帧时检查，不支持则回退到解码模式）
+            self.passthrough = Config.CAMERA_PASSTHROUGH and self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+            
             # 验证实际设置的分辨率
             actual_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             actual_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
             actual_fps = self.cap.get(cv2.CAP_PROP_FPS)
             
-            print(f"✅ 摄像头配置: {actual_width}x{actual_height} @ {actual_fps}fps")
+            print(f"✅ 摄像头配置: {actual_width}x{actual_height} @ {actual_fps}fps{' (MJPEG直通)' if self.passthrough else ''}")
+            self.frame_shape = (actual_height, actual_width, 3)
             
             self.is_running = True
             
@@ -64,6 +79,9 @@ class VideoProcessor:
     def stop_capture(self):
         """停止视频捕获"""
         self.is_running = False
+        # 唤醒所有等待新帧的消费者
+        with self.frame_condition:
+            self.frame_condition.notify_all()
         if hasattr(self, 'capture_thread'):
             self.capture_thread.join(timeout=2)
         
@@ -80,28 +98,62 @@ class VideoProcessor:
         
         while self.is_running and self.cap and self.cap.isOpened():
             try:
-                ret, frame = self.cap.read()
+                if self.passthrough:
+                    handle = None
+                    ret, frame = self.cap.read()
+                    if ret:
+                        handle = self._wrap_encoded(frame)
+                        if handle is None:
+                            frame = None
+                elif self.frame_shape:
+                    handle = self.frame_pool.acquire(self.frame_shape)
+                    ret, frame = self.cap.read(handle.buffer)
+                else:
+                    handle = None
+                    ret, frame = self.cap.read()
+                
+                if ret and frame is None:
+                    # 直通模式不可用，已切换回解码模式，重新读取
+                    continue
+                
                 if ret:
+                    if handle is None or (handle.jpeg is None and frame is not handle.buffer):
+                        # 实际分辨率与预期不一致，OpenCV另行分配了内存，改用该数组
+                        if handle is not None:
+                            handle.release()
+                        handle = self.frame_pool.adopt(frame)
+                        self.frame_shape = frame.shape
+                    
                     frame_count += 1
-                    with self.frame_lock:
-                        self.latest_frame = frame.copy()
+                    with self.frame_condition:
+                        previous = self.latest_handle
+                        self.latest_handle = handle
+                        self.frame_seq += 1
+                        handle.seq = self.frame_seq
+                        handle.timestamp = time.time()
+                        self.frame_timestamp = handle.timestamp
+                        self.frame_condition.notify_all()
+                    if previous is not None:
+                        previous.release()
                     
                     # 将帧放入队列（非阻塞）
                     try:
-                        self.frame_queue.put_nowait(frame)
+                        self.frame_queue.put_nowait(handle.retain())
                     except queue.Full:
                         # 队列满时丢弃最旧的帧
                         try:
-                            self.frame_queue.get_nowait()
-                            self.frame_queue.put_nowait(frame)
+                            self.frame_queue.get_nowait().release()
+                            self.frame_queue.put_nowait(handle)
                         except queue.Empty:
-                            pass
+                            handle.release()
                     
                     # 每100帧打印一次状态
                     if frame_count % 100 == 0:
                         print(f"已捕获 {frame_count} 帧")
                         
                 else:
+                    if handle is not None:
+                        handle.release()
                     print("无法读取视频帧")
                     break
                     
@@ -113,18 +165,70 @@ class VideoProcessor:
         
         print("摄像头捕获循环已停止")
     
+    def _wrap_encoded(self, data):
+        """
+        将直通模式读到的数据包装为延迟解码的帧句柄
+        
+        Args:
+            data: cap.read()返回的数组，直通生效时为一维（或1×N）的JPEG字节
+            
+        Returns:
+            EncodedFrameHandle: 帧句柄；后端仍返回了解码后的图像时返回None并关闭直通模式
+        """
+        jpeg = data.reshape(-1) if data.dtype == np.uint8 and (data.ndim == 1 or 1 in data.shape[:2]) else None
+        if jpeg is None or jpeg.size < 4 or jpeg[0] != 0xFF or jpeg[1] != 0xD8:
+            print("⚠️  摄像头后端不支持MJPEG直通，回退到解码模式")
+            self.passthrough = False
+            self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+            return None
+        return self.frame_pool.wrap_jpeg(jpeg.tobytes(), self.frame_shape)
+    
     def get_latest_frame(self):
         """
         获取最新的视频帧
         
         Returns:
-            numpy.ndarray: 最新的视频帧，如果没有则返回None
+            numpy.ndarray: 最新视频帧的可写副本，如果没有则返回None
         """
         with self.frame_lock:
-            if self.latest_frame is not None:
-                return self.latest_frame.copy()
+            if self.latest_handle is not None:
+                self.frame_pool.record_copy(self.latest_handle.buffer.nbytes)
+                return self.latest_handle.buffer.copy()
         return None
     
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        """
+        等待序号大于after_seq的新帧
+        
+        Args:
+            after_seq: 调用方已处理过的最后一个帧序号
+            timeout: 最长等待秒数，0表示不等待，None表示一直等待
+            
+        Returns:
+            dict: {"handle", "seq", "timestamp"}，超时或已停止时返回None。
+                  handle.frame为共享的只读视图（直通模式下首次访问时解码），
+                  handle.jpeg为摄像头原始JPEG字节（仅直通模式），用完后必须调用handle.release()
+        """
+        with self.frame_condition:
+            if timeout != 0:
+                self.frame_condition.wait_for(
+                    lambda: self.frame_seq > after_seq or not self.is_running,
+                    timeout=timeout
+                )
+            if self.latest_handle is None or self.frame_seq <= after_seq:
+                return None
+            handle = self.latest_handle.retain()
+            return {
+                "handle": handle,
+                "seq": handle.seq,
+                "timestamp": handle.timestamp
+            }
+    
+    def get_frame_seq(self):
+        """获取最新帧序号"""
+        with self.frame_lock:
+            return self.frame_seq
+    
     def get_frame_from_queue(self):
         """
         从队列中获取视频帧
@@ -133,9 +237,12 @@ class VideoProcessor:
             numpy.ndarray: 视频帧，如果队列为空则返回None
         """
         try:
-            return self.frame_queue.get_nowait()
+            handle = self.frame_queue.get_nowait()
         except queue.Empty:
             return None
+        with handle:
+            self.frame_pool.record_copy(handle.buffer.nbytes)
+            return handle.buffer.copy()
     
     def is_camera_available(self):
         """检查摄像头是否可用"""